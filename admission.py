@@ -0,0 +1,217 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from browser_pool import process_tree_rss
+from models import db, Run
+
+log = logging.getLogger(__name__)
+
+# Control de admision por memoria delante de capture_screenshot.
+#
+# Antes de arrancar una captura se estima cuanta memoria va a ocupar su
+# navegador (lo que crecio en capturas anteriores de la misma tarea o, sin
+# historial, una cuenta a partir del viewport) y solo se admite si cabe en la
+# memoria disponible, contando la del contenedor (cgroup). Las que no caben
+# esperan a que termine otra; una captura sola siempre se admite.
+
+MB = 1024 * 1024
+
+# Pagina completa sin historial: alto supuesto para la estimacion
+FULL_PAGE_GUESS_HEIGHT = 5000
+
+
+def _read_int(path: str):
+    try:
+        with open(path, "r") as f:
+            raw = f.read().strip()
+    except OSError:
+        return None
+    if not raw or raw == "max":
+        return None
+    try:
+        return int(raw)
+    except ValueError:
+        return None
+
+
+def _read_kv(path: str) -> dict:
+    out = {}
+    try:
+        with open(path, "r") as f:
+            for line in f:
+                parts = line.replace(":", " ").split()
+                if len(parts) >= 2 and parts[1].isdigit():
+                    out[parts[0]] = int(parts[1])
+    except OSError:
+        pass
+    return out
+
+
+def cgroup_available():
+    """Bytes libres hasta el limite de memoria del cgroup (None si no hay limite)."""
+    # cgroup v2
+    limit = _read_int("/sys/fs/cgroup/memory.max")
+    if limit is not None:
+        usage = _read_int("/sys/fs/cgroup/memory.current") or 0
+        stat = _read_kv("/sys/fs/cgroup/memory.stat")
+        # la cache de ficheros inactiva se libera antes de llegar al OOM
+        usage -= stat.get("inactive_file", 0)
+        return max(0, limit - usage)
+    # cgroup v1 (sin limite aparece como un numero enorme)
+    limit = _read_int("/sys/fs/cgroup/memory/memory.limit_in_bytes")
+    if limit is not None and limit < 1 << 60:
+        usage = _read_int("/sys/fs/cgroup/memory/memory.usage_in_bytes") or 0
+        stat = _read_kv("/sys/fs/cgroup/memory/memory.stat")
+        usage -= stat.get("total_inactive_file", 0)
+        return max(0, limit - usage)
+    return None
+
+
+def host_available():
+    """MemAvailable de /proc/meminfo en bytes (None si no se puede leer)."""
+    kb = _read_kv("/proc/meminfo").get("MemAvailable")
+    return kb * 1024 if kb is not None else None
+
+
+def available_memory():
+    """Memoria disponible para nuevas capturas: la menor entre host y cgroup."""
+    values = [v for v in (host_available(), cgroup_available()) if v is not None]
+    return min(values) if values else None
+
+
+def estimate_mb(task, history: int = 5, margin: float = 1.25, default_mb: int = 300) -> int:
+    """Memoria (MB) que se espera que ocupe una captura de task."""
+    peaks = [
+        p
+        for (p,) in db.session.query(Run.peak_rss_mb)
+        .filter(Run.task_id == task.id, Run.peak_rss_mb.isnot(None))
+        .order_by(Run.id.desc())
+        .limit(history)
+        .all()
+    ]
+    if peaks:
+        return int(max(peaks) * margin)
+    # sin historial: un proceso de renderizado + el lienzo (RGBA) de la captura
+    dsf = float(task.device_scale_factor or 1.0)
+    height = max(int(task.viewport_height or 1080), FULL_PAGE_GUESS_HEIGHT if task.full_page else 0)
+    canvas_mb = int(task.viewport_width or 1920) * height * dsf * dsf * 4 / MB
+    return int(default_mb + canvas_mb * 3)
+
+
+class Ticket:
+    """Captura admitida: memoria reservada y navegador que la ejecuta."""
+
+    def __init__(self, estimate: int):
+        self.estimate = estimate
+        self.pid = None
+        self.base_rss = 0
+        self.peak_rss = 0
+
+    def attach(self, pid, fresh: bool = False):
+        """Navegador de la captura. Si viene del pool (fresh=False), lo que ya
+        ocupaba antes de empezar no cuenta como crecimiento."""
+        if not pid:
+            return
+        self.base_rss = 0 if fresh else process_tree_rss(pid)
+        self.peak_rss = self.base_rss
+        self.pid = pid
+
+    def sample(self) -> int:
+        if self.pid:
+            self.peak_rss = max(self.peak_rss, process_tree_rss(self.pid))
+        return self.peak_rss
+
+    @property
+    def growth(self) -> int:
+        """Bytes que ha crecido el navegador durante la captura (hasta ahora)."""
+        return max(0, self.peak_rss - self.base_rss)
+
+
+class AdmissionController:
+    """Deja empezar una captura solo si su memoria estimada cabe.
+
+    Lo disponible se mide en cada decision (available_memory) y se le resta,
+    de cada captura en curso, lo que aun le falta por crecer hasta su
+    estimacion; reserve_mb queda siempre libre. Un hilo muestrea el RSS de los
+    navegadores en uso para medir el pico de cada captura.
+    """
+
+    def __init__(self, reserve_mb: int = 256, sample_seconds: float = 0.5, measure=available_memory):
+        self.reserve = int(reserve_mb) * MB
+        self.sample_seconds = sample_seconds
+        self.measure = measure
+
+        self._cond = threading.Condition()
+        self._active = []
+        self._waiting = 0
+        self._admitted = 0
+        self._delayed = 0
+        self._sampler = None
+
+    @contextmanager
+    def admit(self, estimate_mb: int):
+        ticket = self._enter(Ticket(int(estimate_mb) * MB))
+        try:
+            yield ticket
+        finally:
+            ticket.sample()
+            with self._cond:
+                self._active.remove(ticket)
+                self._cond.notify_all()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "active": len(self._active),
+                "waiting": self._waiting,
+                "admitted": self._admitted,
+                "delayed": self._delayed,
+                "pending_bytes": self._pending(),
+                "available_bytes": self.measure(),
+            }
+
+    # -------- internos --------
+
+    def _pending(self) -> int:
+        # memoria que las capturas en curso aun van a pedir
+        return sum(max(0, t.estimate - t.growth) for t in self._active)
+
+    def _fits(self, ticket: Ticket) -> bool:
+        if not self._active:
+            return True
+        available = self.measure()
+        if available is None:
+            return True
+        return available - self.reserve - self._pending() >= ticket.estimate
+
+    def _enter(self, ticket: Ticket) -> Ticket:
+        with self._cond:
+            if not self._fits(ticket):
+                self._delayed += 1
+                self._waiting += 1
+                log.info("Captura en espera: necesita ~%d MB", ticket.estimate // MB)
+                try:
+                    while not self._fits(ticket):
+                        # la memoria tambien se libera fuera (navegadores que cierran)
+                        self._cond.wait(1.0)
+                finally:
+                    self._waiting -= 1
+            self._admitted += 1
+            self._active.append(ticket)
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample_loop, name="admission-rss", daemon=True)
+                self._sampler.start()
+        return ticket
+
+    def _sample_loop(self):
+        while True:
+            with self._cond:
+                active = list(self._active)
+            for ticket in active:
+                try:
+                    ticket.sample()
+                except Exception:
+                    log.debug("No se pudo medir el RSS de una captura", exc_info=True)
+            time.sleep(self.sample_seconds)
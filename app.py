@@ -1,35 +1,63 @@
+import json
 import os
+import threading
 import time
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 
 from flask import (
     Flask,
+    Response,
     render_template,
     request,
     redirect,
     url_for,
     flash,
     send_from_directory,
+    send_file,
+    abort,
     session,
     g,
+    jsonify,
 )
 from config import Config
-from models import db, Task, Run, SmtpProfile
-from scheduler import build_scheduler
-from capture import capture_screenshot
-from mailer import send_email_with_screenshot
+from models import db, Task, Run, SmtpProfile, DigestGroup, DigestBatch
+from database import engine_options, configure_engine
+from run_queue import enqueue_run
+from mailer import open_smtp_connection
+from metrics import Metrics
+from imaging import normalize_format
+from prep import compile_prep
+from blocking import parse_resource_types
+import retention
+import digest
+import disk_cache
+import leases
+import migrations
+import thumbs
+from retention import delete_runs
 from translations import LANGUAGES, translate_text
 
-def create_app():
+CAPTURE_MAX_AGE = 365 * 24 * 3600
+
+RUN_STATUSES = {"QUEUED", "RUNNING", "OK", "UNCHANGED", "ERROR"}
+
+def create_app(overrides=None):
+    # overrides: claves de Config a sustituir (p.ej. el benchmark usa directorios temporales)
     app = Flask(__name__)
     app.config.from_object(Config)
-    db.init_app(app)
+    app.config.update(overrides or {})
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", engine_options(app.config))
 
     os.makedirs(app.config["CAPTURES_DIR"], exist_ok=True)
-    os.makedirs("/app/data", exist_ok=True)
+    os.makedirs(app.config["DATA_DIR"], exist_ok=True)
 
+    db.init_app(app)
     with app.app_context():
-        db.create_all()
+        configure_engine(db.engine, app.config)
+        if app.config["DB_MIGRATE_ON_START"]:
+            migrations.upgrade()
+
+    cache_root = app.config["HTTP_CACHE_DIR"] if app.config["HTTP_CACHE_MAX_MB"] > 0 else None
 
     @app.before_request
     def set_language():
@@ -52,64 +80,59 @@ def create_app():
             "languages": LANGUAGES,
         }
 
-    def cleanup_old(task: Task):
-        # Borra capturas viejas segun retention_days
-        if not task.retention_days:
-            return
-        cutoff = datetime.utcnow() - timedelta(days=int(task.retention_days))
-        old_runs = Run.query.filter(Run.task_id == task.id, Run.started_at < cutoff).all()
-        for r in old_runs:
-            if r.screenshot_path:
-                try:
-                    os.remove(r.screenshot_path)
-                except Exception:
-                    pass
-            db.session.delete(r)
-        db.session.commit()
-
-    def run_task(task_id: int, trigger_name: str):
-        with app.app_context():
-            task = Task.query.get(task_id)
-            if not task or not task.enabled:
-                return
-
-            run = Run(task_id=task.id, trigger=trigger_name, started_at=datetime.utcnow(), status="ERROR")
-            db.session.add(run)
-            db.session.commit()
-
-            t0 = time.time()
-            try:
-                smtp = SmtpProfile.query.get(task.smtp_profile_id)
-                if not smtp:
-                    raise RuntimeError("No hay perfil SMTP asociado")
-
-                screenshot_path = capture_screenshot(
-                    task,
-                    chrome_bin=app.config["CHROME_BIN"],
-                    chromedriver_bin=app.config["CHROMEDRIVER_BIN"],
-                    captures_dir=app.config["CAPTURES_DIR"],
-                )
-
-                if trigger_name != "MANUAL_CAPTURE":
-                    send_email_with_screenshot(task, smtp, screenshot_path)
-
-                run.screenshot_path = screenshot_path
-                run.image_bytes = os.path.getsize(screenshot_path) if os.path.exists(screenshot_path) else None
-                run.status = "OK"
-                run.error_message = None
-            except Exception as e:
-                run.status = "ERROR"
-                run.error_message = str(e)
-            finally:
-                run.finished_at = datetime.utcnow()
-                run.duration_ms = int((time.time() - t0) * 1000)
-                db.session.commit()
-                cleanup_old(task)
-
-    sched, reschedule_all = build_scheduler(app, run_task)
-    sched.start()
-    with app.app_context():
-        reschedule_all()
+    @app.template_filter("capture_url")
+    def capture_url(path):
+        # ruta bajo CAPTURES_DIR (las del almacen van en blobs/aa/bb/)
+        rel = os.path.relpath(path, app.config["CAPTURES_DIR"])
+        return "/captures/" + rel.replace(os.sep, "/")
+
+    @app.template_filter("thumb_url")
+    def thumb_url(path, width=160):
+        rel = os.path.relpath(path, app.config["CAPTURES_DIR"])
+        return f"/thumbs/{width}/" + rel.replace(os.sep, "/")
+
+    def enqueue_task(task_id: int, trigger_name: str):
+        # Crea el Run en estado QUEUED; lo ejecuta el worker. Devuelve su id
+        task = Task.query.get(task_id)
+        if not task or not task.enabled:
+            return None
+        run = enqueue_run(task, trigger_name)
+        if run is None:
+            return None
+        if worker is not None:
+            worker.wake()
+        return run.id
+
+    # Worker en el mismo proceso (APP_ROLE=all); con APP_ROLE=web no se
+    # importan Selenium ni APScheduler y los runs los ejecuta `python -m worker`
+    worker = None
+    if app.config["APP_ROLE"] == "all":
+        from worker import Worker
+        worker = Worker(app).start()
+    app.extensions["worker"] = worker
+    app.extensions["enqueue_task"] = enqueue_task
+
+    def schedule_changed(signal: str = "schedule"):
+        # el worker con el lease reprograma los jobs en su siguiente vuelta:
+        # "schedule" solo lo modificado, "resync" todas las tareas
+        leases.touch_signal(signal)
+        if worker is not None:
+            worker.wake()
+
+    def _queued_response(run_id, task_id, message: str):
+        # 202 + id del Run para clientes JSON; el formulario vuelve al historial
+        if request.accept_mimetypes.best == "application/json":
+            if run_id is None:
+                return jsonify({"error": "task not runnable"}), 409
+            resp = jsonify({"run_id": run_id, "status": "QUEUED"})
+            resp.status_code = 202
+            resp.headers["Location"] = url_for("run_status", run_id=run_id)
+            return resp
+        if run_id is None:
+            flash(translate_text("La tarea esta pausada o no existe", g.lang), "danger")
+        else:
+            flash(translate_text(message, g.lang), "success")
+        return redirect(url_for("runs", task_id=task_id))
 
     # -------- ROUTES --------
 
@@ -124,15 +147,41 @@ def create_app():
     @app.get("/")
     def index():
         tasks = Task.query.order_by(Task.id.desc()).all()
-        latest = {}
-        for t in tasks:
-            r = Run.query.filter_by(task_id=t.id).order_by(Run.id.desc()).first()
-            latest[t.id] = r
+        # ultimo run de cada tarea en una sola consulta (usa ix_runs_task_id_id)
+        last_ids = db.session.query(db.func.max(Run.id)).group_by(Run.task_id)
+        latest = {r.task_id: r for r in Run.query.filter(Run.id.in_(last_ids)).all()}
         return render_template("index.html", tasks=tasks, latest=latest)
 
+    def _immutable(resp):
+        # Una captura no cambia nunca una vez escrita (las del almacen se
+        # llaman por su hash): el navegador puede guardarla sin revalidar
+        resp.cache_control.public = True
+        resp.cache_control.immutable = True
+        return resp
+
     @app.get("/captures/<path:filename>")
     def captures(filename):
-        return send_from_directory(app.config["CAPTURES_DIR"], filename)
+        return _immutable(
+            send_from_directory(app.config["CAPTURES_DIR"], filename, max_age=CAPTURE_MAX_AGE, conditional=True)
+        )
+
+    @app.get("/thumbs/<int:width>/<path:filename>")
+    def thumbnail(width, filename):
+        if width not in thumbs.THUMB_WIDTHS:
+            abort(404)
+        root = os.path.realpath(app.config["CAPTURES_DIR"])
+        src = os.path.realpath(os.path.join(root, filename))
+        rel = os.path.relpath(src, root)
+        if not src.startswith(root + os.sep) or rel.split(os.sep)[0] == thumbs.THUMBS_SUBDIR:
+            abort(404)
+        if not os.path.isfile(src):
+            abort(404)
+        try:
+            path = thumbs.get_thumbnail(root, rel, width)
+        except (OSError, ValueError):
+            # no es una imagen que Pillow sepa leer
+            abort(404)
+        return _immutable(send_file(path, mimetype="image/jpeg", max_age=CAPTURE_MAX_AGE, conditional=True))
 
     @app.get("/runs")
     def runs():
@@ -144,7 +193,7 @@ def create_app():
         q = Run.query
         if task_id:
             q = q.filter_by(task_id=task_id)
-        if status in {"OK", "ERROR"}:
+        if status in RUN_STATUSES:
             q = q.filter_by(status=status)
         if from_date:
             try:
@@ -159,25 +208,73 @@ def create_app():
             except ValueError:
                 to_date = ""
 
-        total = q.count()
-        rows = q.order_by(Run.id.desc()).limit(200).all()
+        # Paginacion por cursor sobre Run.id: before=<id> pagina hacia atras
+        # (mas antiguos), after=<id> hacia delante (mas recientes)
+        page_size = app.config["RUNS_PAGE_SIZE"]
+        before = request.args.get("before", type=int)
+        after = request.args.get("after", type=int)
+        if after:
+            rows = q.filter(Run.id > after).order_by(Run.id.asc()).limit(page_size + 1).all()
+            has_newer = len(rows) > page_size
+            rows = list(reversed(rows[:page_size]))
+            has_older = bool(rows) and q.filter(Run.id < rows[-1].id).first() is not None
+        else:
+            page_q = q.filter(Run.id < before) if before else q
+            rows = page_q.order_by(Run.id.desc()).limit(page_size + 1).all()
+            has_older = len(rows) > page_size
+            rows = rows[:page_size]
+            has_newer = bool(before) and bool(rows) and q.filter(Run.id > rows[0].id).first() is not None
+
+        # El total exacto es opcional (count=1) y se guarda un rato en cache
+        filters = {
+            "task_id": task_id or None,
+            "status": status if status in RUN_STATUSES else None,
+            "from_date": from_date or None,
+            "to_date": to_date or None,
+        }
+        count_key = tuple(sorted(filters.items()))
+        total = _cached_count(count_key)
+        if total is None and request.args.get("count") == "1":
+            total = q.order_by(None).count()
+            _store_count(count_key, total)
+
         tasks = Task.query.order_by(Task.name.asc()).all()
         return render_template(
             "runs.html",
             runs=rows,
             tasks=tasks,
             task_id=task_id,
-            status=status if status in {"OK", "ERROR"} else "",
+            status=status if status in RUN_STATUSES else "",
             from_date=from_date,
             to_date=to_date,
             total_runs=total,
             shown=len(rows),
+            filters={k: v for k, v in filters.items() if v is not None},
+            older_cursor=rows[-1].id if has_older and rows else None,
+            newer_cursor=rows[0].id if has_newer and rows else None,
         )
 
+    _count_cache = {}
+    _count_lock = threading.Lock()
+
+    def _cached_count(key):
+        with _count_lock:
+            hit = _count_cache.get(key)
+        if hit and time.time() - hit[0] < app.config["RUNS_COUNT_TTL"]:
+            return hit[1]
+        return None
+
+    def _store_count(key, total: int):
+        with _count_lock:
+            if len(_count_cache) > 256:
+                _count_cache.clear()
+            _count_cache[key] = (time.time(), total)
+
     @app.get("/tasks/new")
     def task_new():
         profiles = SmtpProfile.query.order_by(SmtpProfile.name.asc()).all()
-        return render_template("task_form.html", task=None, profiles=profiles)
+        groups = DigestGroup.query.order_by(DigestGroup.name.asc()).all()
+        return render_template("task_form.html", task=None, profiles=profiles, groups=groups)
 
     @app.post("/tasks/new")
     def task_new_post():
@@ -185,7 +282,7 @@ def create_app():
         _fill_task_from_form(t, request.form)
         db.session.add(t)
         db.session.commit()
-        reschedule_all()
+        schedule_changed()
         flash(translate_text("Tarea creada", g.lang), "success")
         return redirect(url_for("index"))
 
@@ -193,41 +290,52 @@ def create_app():
     def task_edit(task_id):
         t = Task.query.get_or_404(task_id)
         profiles = SmtpProfile.query.order_by(SmtpProfile.name.asc()).all()
-        return render_template("task_form.html", task=t, profiles=profiles)
+        groups = DigestGroup.query.order_by(DigestGroup.name.asc()).all()
+        return render_template("task_form.html", task=t, profiles=profiles, groups=groups)
 
     @app.post("/tasks/<int:task_id>/edit")
     def task_edit_post(task_id):
         t = Task.query.get_or_404(task_id)
         _fill_task_from_form(t, request.form)
         db.session.commit()
-        reschedule_all()
+        schedule_changed()
         flash(translate_text("Tarea actualizada", g.lang), "success")
         return redirect(url_for("index"))
 
     @app.post("/tasks/<int:task_id>/delete")
     def task_delete(task_id):
         t = Task.query.get_or_404(task_id)
-        runs = Run.query.filter_by(task_id=t.id).all()
-        for r in runs:
-            if r.screenshot_path:
-                try:
-                    os.remove(r.screenshot_path)
-                except Exception:
-                    pass
-            db.session.delete(r)
+        delete_runs((Run.task_id == t.id,), retention.new_stats())
 
         db.session.delete(t)
         db.session.commit()
-        reschedule_all()
+        schedule_changed()
         flash(translate_text("Tarea eliminada", g.lang), "success")
         return redirect(url_for("index"))
 
+    @app.post("/scheduler/resync")
+    def scheduler_resync():
+        schedule_changed("resync")
+        flash(translate_text("Programacion resincronizada", g.lang), "success")
+        return redirect(url_for("index"))
+
+    @app.post("/cache/purge")
+    def cache_purge():
+        freed = disk_cache.purge(cache_root) if cache_root else 0
+        # los navegadores del pool estan en el worker: la vacian en su proximo uso
+        leases.touch_signal("purge-cache")
+        flash(
+            translate_text("Cache HTTP vaciada ({mb} MB liberados)", g.lang).format(mb=freed // (1024 * 1024)),
+            "success",
+        )
+        return redirect(url_for("index"))
+
     @app.post("/tasks/<int:task_id>/toggle")
     def task_toggle(task_id):
         t = Task.query.get_or_404(task_id)
         t.enabled = not t.enabled
         db.session.commit()
-        reschedule_all()
+        schedule_changed()
         flash(
             translate_text("Tarea activada", g.lang)
             if t.enabled
@@ -238,23 +346,162 @@ def create_app():
 
     @app.post("/tasks/<int:task_id>/capture")
     def task_capture(task_id):
-        run_task(task_id, "MANUAL_CAPTURE")
-        flash(
-            translate_text(
-                "Captura hecha (sin enviar correo). Mira el historial.", g.lang
-            ),
-            "success",
+        run_id = enqueue_task(task_id, "MANUAL_CAPTURE")
+        return _queued_response(
+            run_id, task_id, "Captura en cola (sin enviar correo). Mira el historial."
         )
-        return redirect(url_for("runs", task_id=task_id))
 
     @app.post("/tasks/<int:task_id>/run")
     def task_run(task_id):
-        run_task(task_id, "MANUAL_TEST")
-        flash(
-            translate_text("Test completo ejecutado. Mira el historial.", g.lang),
-            "success",
+        run_id = enqueue_task(task_id, "MANUAL_TEST")
+        return _queued_response(run_id, task_id, "Test completo en cola. Mira el historial.")
+
+    @app.get("/metrics")
+    def metrics_endpoint():
+        # la cola vive en la BD; el resto son metricas del worker de este
+        # proceso (un worker dedicado las sirve en WORKER_METRICS_PORT)
+        queued = db.session.query(db.func.count(Run.id)).filter(Run.status == "QUEUED").scalar()
+        gauges = [("webshot_queue_depth", "Runs esperando en la cola", queued, {})]
+        if worker is None:
+            return Response(Metrics().render(gauges), mimetype="text/plain; version=0.0.4")
+        return Response(
+            worker.metrics.render(gauges + worker.metric_gauges()), mimetype="text/plain; version=0.0.4"
         )
-        return redirect(url_for("runs", task_id=task_id))
+
+    @app.get("/scheduler/hotspots")
+    def scheduler_hotspots():
+        # minutos con mas tareas programadas en las proximas horas (con el jitter aplicado)
+        from scheduler import due_per_minute
+
+        hours = min(max(request.args.get("hours", 24, type=int), 1), 24 * 7)
+        top = min(max(request.args.get("top", 20, type=int), 1), 500)
+        start = datetime.now(timezone.utc)
+        due, unanchored = due_per_minute(
+            Task.query.filter_by(enabled=True).all(),
+            app.config["DEFAULT_TZ"],
+            app.config["SCHEDULE_JITTER_SECONDS"],
+            start,
+            start + timedelta(hours=hours),
+        )
+        busiest = sorted(due.items(), key=lambda kv: (-len(kv[1]), kv[0]))[:top]
+        return jsonify(
+            {
+                "hours": hours,
+                "jitter_seconds": app.config["SCHEDULE_JITTER_SECONDS"],
+                "runs": sum(len(ids) for ids in due.values()),
+                # INTERVAL sin jitter: su fase depende de cuando el worker creo el job
+                "unanchored_task_ids": unanchored,
+                "peak": len(busiest[0][1]) if busiest else 0,
+                "minutes": [
+                    {"minute": m.isoformat() + "Z", "runs": len(ids), "task_ids": ids} for m, ids in busiest
+                ],
+            }
+        )
+
+    @app.get("/retention")
+    def retention_stats():
+        return jsonify(leases.get_state("retention"))
+
+    @app.get("/runs/<int:run_id>")
+    def run_status(run_id):
+        r = Run.query.get_or_404(run_id)
+        return jsonify(
+            {
+                "run_id": r.id,
+                "task_id": r.task_id,
+                "trigger": r.trigger,
+                "status": r.status,
+                "started_at": r.started_at.isoformat() if r.started_at else None,
+                "finished_at": r.finished_at.isoformat() if r.finished_at else None,
+                "duration_ms": r.duration_ms,
+                "phases_ms": json.loads(r.phases_json) if r.phases_json else None,
+                "worker_id": r.worker_id,
+                "attempts": r.attempts,
+                "peak_rss_mb": r.peak_rss_mb,
+                "error_message": r.error_message,
+            }
+        )
+
+    @app.get("/digests")
+    def digest_list():
+        groups = DigestGroup.query.order_by(DigestGroup.name.asc()).all()
+        last_batches = {}
+        for b in DigestBatch.query.order_by(DigestBatch.id.desc()).limit(max(len(groups) * 5, 50)).all():
+            last_batches.setdefault(b.group_id, b)
+        return render_template("digest_list.html", groups=groups, last_batches=last_batches)
+
+    @app.get("/digests/new")
+    def digest_new():
+        return render_template("digest_form.html", grp=None, **_digest_form_choices())
+
+    @app.post("/digests/new")
+    def digest_new_post():
+        grp = DigestGroup()
+        _fill_digest_from_form(grp, request.form)
+        db.session.add(grp)
+        db.session.flush()
+        _set_digest_tasks(grp, request.form.getlist("task_ids"))
+        db.session.commit()
+        schedule_changed()
+        flash(translate_text("Grupo creado", g.lang), "success")
+        return redirect(url_for("digest_list"))
+
+    @app.get("/digests/<int:gid>/edit")
+    def digest_edit(gid):
+        grp = DigestGroup.query.get_or_404(gid)
+        return render_template("digest_form.html", grp=grp, **_digest_form_choices())
+
+    @app.post("/digests/<int:gid>/edit")
+    def digest_edit_post(gid):
+        grp = DigestGroup.query.get_or_404(gid)
+        _fill_digest_from_form(grp, request.form)
+        _set_digest_tasks(grp, request.form.getlist("task_ids"))
+        db.session.commit()
+        schedule_changed()
+        flash(translate_text("Grupo actualizado", g.lang), "success")
+        return redirect(url_for("digest_list"))
+
+    @app.post("/digests/<int:gid>/run")
+    def digest_run(gid):
+        grp = DigestGroup.query.get_or_404(gid)
+        batch = digest.enqueue_digest(grp)
+        if batch is None:
+            flash(translate_text("El grupo no tiene tareas activas o ya se esta enviando", g.lang), "warning")
+        else:
+            if worker is not None:
+                worker.wake()
+            flash(translate_text("Resumen en cola. Mira el historial.", g.lang), "success")
+        return redirect(url_for("digest_list"))
+
+    @app.post("/digests/<int:gid>/delete")
+    def digest_delete(gid):
+        grp = DigestGroup.query.get_or_404(gid)
+        # las tareas vuelven a su programacion propia; los lotes quedan en el historial
+        Task.query.filter_by(digest_group_id=grp.id).update({"digest_group_id": None}, synchronize_session=False)
+        DigestBatch.query.filter_by(group_id=grp.id).update({"group_id": None}, synchronize_session=False)
+        db.session.delete(grp)
+        db.session.commit()
+        schedule_changed()
+        flash(translate_text("Grupo eliminado", g.lang), "success")
+        return redirect(url_for("digest_list"))
+
+    def _digest_form_choices():
+        return {
+            "profiles": SmtpProfile.query.order_by(SmtpProfile.name.asc()).all(),
+            "tasks": Task.query.order_by(Task.name.asc()).all(),
+        }
+
+    def _fill_digest_from_form(grp: DigestGroup, f):
+        grp.name = f.get("name", "").strip()
+        grp.enabled = (f.get("enabled") == "on")
+        _fill_schedule_from_form(grp, f)
+        grp.smtp_profile_id = int(f.get("smtp_profile_id"))
+        grp.subject_template = f.get("subject_template", "").strip() or "Resumen {group_name} {date} {time}"
+
+    def _set_digest_tasks(grp: DigestGroup, task_ids):
+        wanted = {int(x) for x in task_ids if str(x).isdigit()}
+        for t in Task.query.filter(db.or_(Task.digest_group_id == grp.id, Task.id.in_(wanted))).all():
+            t.digest_group_id = grp.id if t.id in wanted else None
 
     @app.get("/smtp")
     def smtp_list():
@@ -305,7 +552,6 @@ def create_app():
         # para reutilizar mailer: le pasamos una imagen dummy inline? mas simple:
         # aqui enviamos sin imagen: hack rapido -> mandamos un correo simple directo
         try:
-            import smtplib
             from email.mime.text import MIMEText
             pwd = os.getenv(p.password_env, "")
             if not pwd:
@@ -318,17 +564,9 @@ def create_app():
             msg["From"] = p.from_email
             msg["To"] = p.from_email
             msg["Subject"] = "SMTP OK"
-            enc = (p.encryption or "STARTTLS").upper()
-
-            if enc == "SSL":
-                s = smtplib.SMTP_SSL(p.host, int(p.port), timeout=30)
-            else:
-                s = smtplib.SMTP(p.host, int(p.port), timeout=30)
-            s.ehlo()
-            if enc == "STARTTLS":
-                s.starttls()
-                s.ehlo()
-            s.login(p.username, pwd)
+
+            # sin pool: la prueba debe comprobar un login real contra el servidor
+            s = open_smtp_connection(p, pwd)
             s.sendmail(p.from_email, [p.from_email], msg.as_string())
             s.quit()
             flash(translate_text("SMTP OK (correo enviado)", g.lang), "success")
@@ -344,6 +582,7 @@ def create_app():
     def smtp_delete(pid):
         p = SmtpProfile.query.get_or_404(pid)
         in_use = Task.query.filter_by(smtp_profile_id=p.id).count()
+        in_use += DigestGroup.query.filter_by(smtp_profile_id=p.id).count()
         if in_use:
             flash(
                 translate_text(
@@ -368,19 +607,26 @@ def create_app():
         p.from_email = f.get("from_email", "").strip()
         p.reply_to = (f.get("reply_to", "").strip() or None)
 
+    def _fill_schedule_from_form(obj, f):
+        # Task y DigestGroup comparten los campos de programacion
+        obj.timezone = f.get("timezone", "Europe/Madrid").strip()
+
+        obj.schedule_type = f.get("schedule_type", "DAILY").strip().upper()
+        obj.time_hhmm = (f.get("time_hhmm", "").strip() or None)
+        obj.weekdays = (f.get("weekdays", "").strip() or None)
+        obj.interval_minutes = int(f.get("interval_minutes") or 0) or None
+        jitter = f.get("jitter_seconds", "").strip()
+        obj.jitter_seconds = max(0, int(jitter)) if jitter else None
+
     def _fill_task_from_form(t: Task, f):
         t.name = f.get("name", "").strip()
         t.enabled = (f.get("enabled") == "on")
-        t.timezone = f.get("timezone", "Europe/Madrid").strip()
-
-        t.schedule_type = f.get("schedule_type", "DAILY").strip().upper()
-        t.time_hhmm = (f.get("time_hhmm", "").strip() or None)
-        t.weekdays = (f.get("weekdays", "").strip() or None)
-        t.interval_minutes = int(f.get("interval_minutes") or 0) or None
+        _fill_schedule_from_form(t, f)
+        t.digest_group_id = int(f.get("digest_group_id") or 0) or None
 
         t.url = f.get("url", "").strip()
         t.viewport_width = int(f.get("viewport_width") or 1920)
-        t.viewport_height = int(f.get("viewport_height") or 5000)
+        t.viewport_height = int(f.get("viewport_height") or 1080)
         t.full_page = (f.get("full_page") == "on")
 
         t.device_scale_factor = float(f.get("device_scale_factor") or 1.0)
@@ -392,8 +638,14 @@ def create_app():
 
         t.remove_selectors = f.get("remove_selectors", "[]").strip() or "[]"
         t.pre_js = (f.get("pre_js", "").strip() or None)
+        t.prep_script = compile_prep(t)
+
+        t.block_resource_types = ",".join(parse_resource_types(",".join(f.getlist("block_resource_types")))) or None
+        t.block_patterns = (f.get("block_patterns", "").strip() or None)
+        t.use_default_blocklist = (f.get("use_default_blocklist") == "on")
+        t.use_disk_cache = (f.get("use_disk_cache") == "on")
 
-        t.image_format = f.get("image_format", "PNG").strip().upper()
+        t.image_format = normalize_format(f.get("image_format", "PNG"))
         t.jpeg_quality = int(f.get("jpeg_quality") or 0) or None
         t.max_width = int(f.get("max_width") or 0) or None
 
@@ -411,6 +663,9 @@ def create_app():
         t.attach_file = (f.get("attach_file") == "on")
         t.retention_days = int(f.get("retention_days") or 14)
 
+        t.send_only_on_change = (f.get("send_only_on_change") == "on")
+        t.change_threshold = float(f.get("change_threshold") or 0)
+
     return app
 
 if __name__ == "__main__":
@@ -0,0 +1,4 @@
+"""Benchmark sin red: servidor de paginas local + sumidero SMTP local.
+
+Uso: python -m bench --help
+"""
@@ -0,0 +1,369 @@
+import argparse
+import itertools
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from bench.fixtures import FixtureServer
+from bench.smtp_sink import SmtpSink
+
+# Escenarios: ruta del servidor de pruebas + ajustes de la tarea
+SCENARIOS = {
+    "static": ("/static", {"wait_mode": "SLEEP", "wait_seconds": 0}),
+    "tall": ("/tall?h=8000", {"wait_mode": "SLEEP", "wait_seconds": 0, "full_page": True}),
+    "slow": ("/slow?n=6&delay_ms=800", {"wait_mode": "NETWORK_IDLE", "wait_seconds": 10}),
+    "late": ("/late?delay_ms=1500", {"wait_mode": "SELECTOR", "wait_seconds": 10, "wait_selector": "#ready"}),
+}
+
+SMTP_PASSWORD_ENV = "BENCH_SMTP_PASS"
+
+
+def make_task(**values):
+    """Task sin guardar con los valores por defecto de las columnas."""
+    from models import Task
+
+    task = Task()
+    for col in Task.__table__.columns:
+        default = col.default.arg if col.default is not None and not callable(col.default.arg) else None
+        setattr(task, col.name, default)
+    for k, v in values.items():
+        setattr(task, k, v)
+    return task
+
+
+def make_smtp_profile(sink):
+    from models import SmtpProfile
+
+    return SmtpProfile(
+        id=1, name="bench-sink", host=sink.host, port=sink.port, encryption="NONE",
+        username="bench", password_env=SMTP_PASSWORD_ENV, from_email="bench@localhost",
+    )
+
+
+def percentile(values, p: float):
+    if not values:
+        return None
+    # rango mas cercano
+    values = sorted(values)
+    k = max(0, min(len(values) - 1, math.ceil(p / 100.0 * len(values)) - 1))
+    return values[k]
+
+
+class RssSampler:
+    """Pico de RSS de este proceso y sus hijos (chromedriver + Chromium)."""
+
+    def __init__(self, interval: float = 0.2):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+
+    def _loop(self):
+        from browser_pool import process_tree_rss
+
+        while not self._stop.is_set():
+            self.peak = max(self.peak, process_tree_rss(os.getpid()))
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        threading.Thread(target=self._loop, name="bench-rss", daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+
+
+def _dir_bytes(path: str) -> int:
+    total = 0
+    for root, _dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _jobs(args, server):
+    return [
+        (f"{name}-{i}", name, server.base_url + SCENARIOS[name][0], SCENARIOS[name][1])
+        for i in range(args.iterations)
+        for name in args.scenarios
+    ]
+
+
+# -------- modos --------
+
+def bench_capture(args, server, sink, workdir):
+    from browser_pool import BrowserPool
+    from capture import capture_screenshot, build_driver
+
+    captures_dir = os.path.join(workdir, "captures")
+    pool = None
+    if args.pool > 0:
+        pool = BrowserPool(lambda _n: build_driver(args.chrome_bin, args.chromedriver_bin), size=args.pool)
+
+    ids = itertools.count(1)
+
+    def one(job):
+        label, _scenario, url, settings = job
+        task = make_task(id=next(ids), name=label, url=url, **settings)
+        phases = {}
+        t0 = time.perf_counter()
+        path = capture_screenshot(
+            task, args.chrome_bin, args.chromedriver_bin, captures_dir, pool=pool, stats={}, phases=phases
+        )
+        phases["total"] = int((time.perf_counter() - t0) * 1000)
+        return phases, os.path.getsize(path)
+
+    try:
+        results, elapsed = _run_jobs(args, _jobs(args, server), one)
+        return results, elapsed, sum(1 for r in results if r[0])
+    finally:
+        if pool is not None:
+            pool.close()
+
+
+def bench_email(args, server, sink, workdir):
+    from PIL import Image
+    from mailer import send_email_with_screenshot
+    from smtp_pool import SmtpPool
+
+    # imagen de ruido: no comprime, tamaño parecido a una captura real
+    image_path = os.path.join(workdir, "bench.png")
+    Image.effect_noise((args.image_width, args.image_height), 64).convert("RGB").save(image_path)
+    profile = make_smtp_profile(sink)
+    pool = SmtpPool(max_per_profile=args.concurrency) if args.smtp_pool else None
+
+    def one(job):
+        label = job[0]
+        task = make_task(id=1, name=label, url="http://bench.invalid/", to_emails="to@localhost")
+        phases = {}
+        t0 = time.perf_counter()
+        send_email_with_screenshot(task, profile, image_path, pool=pool, phases=phases)
+        phases["total"] = int((time.perf_counter() - t0) * 1000)
+        return phases, 0
+
+    jobs = [(f"email-{i}", "email", None, {}) for i in range(args.iterations)]
+    try:
+        results, elapsed = _run_jobs(args, jobs, one)
+        return results, elapsed, None
+    finally:
+        if pool is not None:
+            pool.close_all()
+
+
+def bench_run(args, server, sink, workdir):
+    from app import create_app
+    from models import db, Task, Run
+
+    app = create_app(
+        {
+            "DATA_DIR": workdir,
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+            "CAPTURES_DIR": os.path.join(workdir, "captures"),
+            "HTTP_CACHE_DIR": os.path.join(workdir, "http-cache"),
+            "CHROME_BIN": args.chrome_bin,
+            "CHROMEDRIVER_BIN": args.chromedriver_bin,
+            "BROWSER_POOL_SIZE": args.pool,
+            "RUN_WORKERS": args.concurrency,
+            "SMTP_POOL_SIZE": args.concurrency if args.smtp_pool else 0,
+            # cada run tiene que ser un render de verdad: sin esto, con -c > 1 las
+            # repeticiones de un escenario se unen a la captura en curso
+            "COALESCE_ENABLED": False,
+        }
+    )
+    enqueue = app.extensions["enqueue_task"]
+
+    with app.app_context():
+        profile = make_smtp_profile(sink)
+        profile.id = None
+        db.session.add(profile)
+        db.session.commit()
+        task_ids = {}
+        for name in args.scenarios:
+            path, settings = SCENARIOS[name]
+            t = Task(
+                name=f"bench-{name}", url=server.base_url + path, smtp_profile_id=profile.id,
+                to_emails="to@localhost", schedule_type="INTERVAL", interval_minutes=24 * 60,
+                enabled=True, **settings,
+            )
+            db.session.add(t)
+            db.session.commit()
+            task_ids[name] = t.id
+
+    t0 = time.perf_counter()
+    run_ids = [enqueue(task_ids[name], "MANUAL_TEST") for _ in range(args.iterations) for name in args.scenarios]
+    with app.app_context():
+        while True:
+            db.session.expire_all()
+            pending = Run.query.filter(Run.id.in_(run_ids), Run.status.in_(["QUEUED", "RUNNING"])).count()
+            if not pending:
+                break
+            time.sleep(0.2)
+        elapsed = time.perf_counter() - t0
+        results = []
+        renders = 0
+        for r in Run.query.filter(Run.id.in_(run_ids)).all():
+            ok = r.status in ("OK", "UNCHANGED")
+            results.append((ok, json.loads(r.phases_json or "{}"), r.image_bytes or 0, r.error_message))
+            if ok and not json.loads(r.stats_json or "{}").get("coalesced"):
+                renders += 1
+    return results, elapsed, renders
+
+
+def _run_jobs(args, jobs, one):
+    results = []
+    lock = threading.Lock()
+
+    def wrapped(job):
+        try:
+            phases, size = one(job)
+            res = (True, phases, size, None)
+        except Exception as e:
+            res = (False, {}, 0, f"{job[0]}: {e}")
+        with lock:
+            results.append(res)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as ex:
+        list(ex.map(wrapped, jobs))
+    return results, time.perf_counter() - t0
+
+
+MODES = {"capture": bench_capture, "email": bench_email, "run": bench_run}
+
+
+# -------- informe --------
+
+def _git_version():
+    try:
+        return subprocess.check_output(
+            ["git", "describe", "--always", "--dirty"], cwd=os.path.dirname(os.path.dirname(__file__)),
+            stderr=subprocess.DEVNULL, text=True,
+        ).strip()
+    except Exception:
+        return None
+
+
+def build_report(args, results, elapsed, renders, peak_rss, bytes_written, sink) -> dict:
+    ok = [r for r in results if r[0]]
+    phase_values = {}
+    for _ok, phases, _size, _err in ok:
+        for name, ms in phases.items():
+            phase_values.setdefault(name, []).append(ms)
+
+    return {
+        "version": _git_version(),
+        "created_at": datetime.utcnow().isoformat(),
+        "mode": args.mode,
+        "scenarios": args.scenarios if args.mode != "email" else None,
+        "iterations": args.iterations,
+        "concurrency": args.concurrency,
+        "browser_pool": args.pool,
+        "runs": len(results),
+        "ok": len(ok),
+        "renders": renders,  # capturas hechas de verdad (None en modo email)
+        "errors": [r[3] for r in results if not r[0]][:20],
+        "elapsed_s": round(elapsed, 3),
+        "per_minute": round(len(ok) / elapsed * 60, 2) if elapsed else None,
+        "phases_ms": {
+            name: {
+                "n": len(v),
+                "p50": percentile(v, 50),
+                "p95": percentile(v, 95),
+                "max": max(v),
+            }
+            for name, v in sorted(phase_values.items())
+        },
+        "peak_rss_mb": round(peak_rss / (1024 * 1024), 1),
+        "bytes_written": bytes_written,
+        "smtp": {"messages": sink.messages, "bytes": sink.bytes_received},
+    }
+
+
+def print_report(report: dict, baseline=None):
+    renders = f", {report['renders']} renders" if report.get("renders") is not None else ""
+    print(f"{report['mode']}: {report['ok']}/{report['runs']} ok{renders} en {report['elapsed_s']} s"
+          f" -> {report['per_minute']} /min, pico RSS {report['peak_rss_mb']} MB,"
+          f" {report['bytes_written']} bytes escritos, {report['smtp']['messages']} correos")
+    base_phases = (baseline or {}).get("phases_ms", {})
+    print(f"{'fase':<12}{'p50':>9}{'p95':>9}{'max':>9}" + (f"{'p95 antes':>12}{'cambio':>9}" if baseline else ""))
+    for name, st in report["phases_ms"].items():
+        line = f"{name:<12}{st['p50']:>9}{st['p95']:>9}{st['max']:>9}"
+        old = base_phases.get(name)
+        if old and old.get("p95"):
+            line += f"{old['p95']:>12}{(st['p95'] - old['p95']) / old['p95'] * 100:>+8.1f}%"
+        print(line)
+    if baseline and baseline.get("per_minute"):
+        delta = (report["per_minute"] - baseline["per_minute"]) / baseline["per_minute"] * 100
+        print(f"capturas/min: {baseline['per_minute']} -> {report['per_minute']} ({delta:+.1f}%)")
+    for err in report["errors"]:
+        print("  error:", err)
+
+
+def main(argv=None):
+    from config import Config
+
+    ap = argparse.ArgumentParser(prog="python -m bench", description="Benchmark local de WebShot Mailer")
+    ap.add_argument("mode", choices=sorted(MODES), help="capture: solo capture_screenshot; email: solo envio; run: run_task completo")
+    ap.add_argument("-n", "--iterations", type=int, default=5, help="repeticiones de cada escenario")
+    ap.add_argument("-c", "--concurrency", type=int, default=2)
+    ap.add_argument("--scenarios", default=",".join(SCENARIOS), help="csv: " + ",".join(SCENARIOS))
+    ap.add_argument("--pool", type=int, default=2, help="navegadores del pool (0 = uno nuevo por captura)")
+    ap.add_argument("--smtp-pool", action="store_true", help="reutilizar sesiones SMTP")
+    ap.add_argument("--image-width", type=int, default=1920)
+    ap.add_argument("--image-height", type=int, default=3000)
+    ap.add_argument("--chrome-bin", default=Config.CHROME_BIN)
+    ap.add_argument("--chromedriver-bin", default=Config.CHROMEDRIVER_BIN)
+    ap.add_argument("-o", "--out", default=None, help="fichero JSON de resultados")
+    ap.add_argument("--compare", default=None, help="JSON de una ejecucion anterior para comparar")
+    args = ap.parse_args(argv)
+
+    args.scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [s for s in args.scenarios if s not in SCENARIOS]
+    if unknown:
+        ap.error(f"escenarios desconocidos: {', '.join(unknown)}")
+
+    # antes de medir: un --compare erroneo no debe tirar una ejecucion de minutos
+    baseline = None
+    if args.compare:
+        try:
+            with open(args.compare, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            ap.error(f"no se puede leer --compare {args.compare}: {e}")
+        if not isinstance(baseline, dict) or "phases_ms" not in baseline:
+            ap.error(f"--compare {args.compare} no es un JSON de resultados de python -m bench")
+
+    os.environ.setdefault(SMTP_PASSWORD_ENV, "bench")
+    workdir = tempfile.mkdtemp(prefix="webshot-bench-")
+    server = FixtureServer().start()
+    sink = SmtpSink().start()
+    try:
+        with RssSampler() as rss:
+            results, elapsed, renders = MODES[args.mode](args, server, sink, workdir)
+        report = build_report(args, results, elapsed, renders, rss.peak, _dir_bytes(os.path.join(workdir, "captures")), sink)
+    finally:
+        server.stop()
+        sink.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print_report(report, baseline)
+
+    out = args.out or f"bench-{args.mode}-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.json"
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print("Resultados en", out)
+    return 0 if report["ok"] == report["runs"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
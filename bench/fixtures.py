@@ -0,0 +1,120 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+# Paginas de prueba para el benchmark. Todas aceptan parametros por query:
+#
+#   /static                    pagina sencilla
+#   /tall?h=8000               pagina muy alta (pagina completa por tramos)
+#   /slow?n=6&delay_ms=800     n imagenes y un script que tardan delay_ms en llegar
+#   /late?delay_ms=1500        #ready aparece delay_ms despues de cargar (modo SELECTOR)
+#   /asset/slow.png|.js?delay_ms=...  recurso lento
+
+# PNG 1x1 transparente
+_PIXEL = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6300010000000500010d0a2db40000"
+    "000049454e44ae426082"
+)
+
+_STYLE = """
+body { font-family: sans-serif; margin: 0; }
+header { background: #234; color: #fff; padding: 24px; }
+.card { margin: 16px; padding: 16px; border: 1px solid #ccc; border-radius: 8px; }
+.band { height: 400px; }
+"""
+
+
+def _page(title: str, body: str, head: str = "") -> bytes:
+    return (
+        "<!doctype html><html><head><meta charset='utf-8'>"
+        f"<title>{title}</title><style>{_STYLE}</style>{head}</head>"
+        f"<body><header><h1>{title}</h1></header>{body}</body></html>"
+    ).encode("utf-8")
+
+
+def _cards(n: int) -> str:
+    return "".join(f"<div class='card'><h3>Elemento {i}</h3><p>{'Lorem ipsum dolor sit amet. ' * 8}</p></div>" for i in range(n))
+
+
+def _int(q: dict, name: str, default: int) -> int:
+    try:
+        return int(q.get(name, [default])[0])
+    except (TypeError, ValueError):
+        return default
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        q = parse_qs(parts.query)
+        path = parts.path
+
+        if path == "/static":
+            self._send(_page("Static", _cards(12)))
+        elif path == "/tall":
+            h = _int(q, "h", 8000)
+            bands = "".join(
+                f"<div class='band' style='background:hsl({(i * 37) % 360},60%,85%)'>{i * 400}px</div>"
+                for i in range(max(1, h // 400))
+            )
+            self._send(_page("Tall", bands))
+        elif path == "/slow":
+            n = _int(q, "n", 6)
+            delay = _int(q, "delay_ms", 800)
+            imgs = "".join(f"<img src='/asset/slow.png?delay_ms={delay}&i={i}' width='64' height='64'>" for i in range(n))
+            head = f"<script src='/asset/slow.js?delay_ms={delay}'></script>"
+            self._send(_page("Slow", f"<div class='card'>{imgs}</div>" + _cards(6), head))
+        elif path == "/late":
+            delay = _int(q, "delay_ms", 1500)
+            script = (
+                "<script>setTimeout(() => { const d = document.createElement('div');"
+                "d.id = 'ready'; d.className = 'card'; d.textContent = 'Listo';"
+                f"document.body.appendChild(d); }}, {delay});</script>"
+            )
+            self._send(_page("Late", _cards(4) + script))
+        elif path.startswith("/asset/slow."):
+            time.sleep(_int(q, "delay_ms", 800) / 1000.0)
+            if path.endswith(".js"):
+                self._send(b"window.__slow = true;", "application/javascript")
+            else:
+                self._send(_PIXEL, "image/png")
+        else:
+            self._send(b"not found", "text/plain", 404)
+
+    def _send(self, body: bytes, ctype: str = "text/html; charset=utf-8", status: int = 200):
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FixtureServer:
+    """Servidor HTTP de paginas de prueba en 127.0.0.1 (puerto libre si port=0)."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="bench-http", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,94 @@
+import base64
+import socketserver
+import threading
+
+# Sumidero SMTP para el benchmark: acepta cualquier AUTH PLAIN/LOGIN y
+# cualquier mensaje, y solo cuenta mensajes y bytes recibidos. Sin TLS: los
+# perfiles del benchmark usan encryption=NONE.
+
+
+class _Session(socketserver.StreamRequestHandler):
+    def handle(self):
+        sink = self.server.sink
+        self._reply("220 bench-sink ESMTP")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            cmd = line.decode("utf-8", "replace").strip()
+            verb = cmd.split(" ", 1)[0].upper()
+
+            if verb in ("EHLO", "HELO"):
+                if verb == "EHLO":
+                    self._reply("250-bench-sink", "250-AUTH PLAIN LOGIN", "250-8BITMIME", "250 SIZE 104857600")
+                else:
+                    self._reply("250 bench-sink")
+            elif verb == "AUTH":
+                args = cmd.split()[1:]
+                if args and args[0].upper() == "LOGIN":
+                    self._reply("334 " + base64.b64encode(b"Username:").decode())
+                    self.rfile.readline()
+                    self._reply("334 " + base64.b64encode(b"Password:").decode())
+                    self.rfile.readline()
+                elif len(args) == 1:
+                    self._reply("334 ")
+                    self.rfile.readline()
+                self._reply("235 2.7.0 Authentication successful")
+            elif verb in ("MAIL", "RCPT", "RSET", "NOOP"):
+                self._reply("250 OK")
+            elif verb == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                size = 0
+                while True:
+                    chunk = self.rfile.readline()
+                    if not chunk or chunk in (b".\r\n", b".\n"):
+                        break
+                    size += len(chunk)
+                sink.record(size)
+                self._reply("250 OK queued")
+            elif verb == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+    def _reply(self, *lines):
+        self.wfile.write(("\r\n".join(lines) + "\r\n").encode("ascii"))
+        self.wfile.flush()
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SmtpSink:
+    """Servidor SMTP local que descarta los mensajes (puerto libre si port=0)."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.server = _Server((host, port), _Session)
+        self.server.sink = self
+        self._lock = threading.Lock()
+        self.messages = 0
+        self.bytes_received = 0
+
+    @property
+    def host(self) -> str:
+        return self.server.server_address[0]
+
+    @property
+    def port(self) -> int:
+        return self.server.server_address[1]
+
+    def record(self, size: int):
+        with self._lock:
+            self.messages += 1
+            self.bytes_received += size
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name="bench-smtp", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,122 @@
+import hashlib
+import os
+from collections import Counter
+
+import sqlalchemy as sa
+
+from models import db, Blob
+
+# Almacen de capturas direccionado por contenido.
+#
+# Cada captura se guarda una sola vez como blobs/<aa>/<bb>/<sha256>.<ext> bajo
+# CAPTURES_DIR; los runs con la misma imagen apuntan al mismo fichero
+# (Run.screenshot_path) y Blob.refcount cuenta cuantos lo referencian. El
+# fichero se borra cuando el ultimo run que lo usa desaparece (release()).
+
+BLOBS_SUBDIR = "blobs"
+
+
+def blob_path(captures_dir: str, digest: str, ext: str) -> str:
+    return os.path.join(captures_dir, BLOBS_SUBDIR, digest[:2], digest[2:4], digest + ext)
+
+
+def _file_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def put(captures_dir: str, src_path: str):
+    """Mueve src_path al almacen y suma una referencia. Devuelve (hash, ruta).
+
+    Si ya existe un blob con el mismo contenido, src_path se borra.
+    """
+    digest = _file_hash(src_path)
+    path = blob_path(captures_dir, digest, os.path.splitext(src_path)[1].lower())
+    size = os.path.getsize(src_path)
+
+    # la referencia se confirma antes de tocar el fichero: release() solo
+    # borra blobs con refcount 0, asi que a partir de aqui el fichero es nuestro
+    if _incref(digest):
+        path = db.session.query(Blob.path).filter(Blob.hash == digest).scalar() or path
+    else:
+        try:
+            db.session.add(Blob(hash=digest, path=path, size=size, refcount=1))
+            db.session.commit()
+        except sa.exc.IntegrityError:
+            # otro worker acaba de crear el mismo blob
+            db.session.rollback()
+            if not _incref(digest):
+                raise
+
+    if os.path.exists(path):
+        os.remove(src_path)
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(src_path, path)
+    return digest, path
+
+
+def add_ref(digest: str):
+    """Suma una referencia a un blob existente (otro run con la misma captura)."""
+    if not _incref(digest):
+        raise RuntimeError(f"La captura {digest} ya no esta en el almacen")
+    path = db.session.query(Blob.path).filter(Blob.hash == digest).scalar()
+    if not path or not os.path.exists(path):
+        raise RuntimeError(f"Falta el fichero de la captura {digest}")
+    return path
+
+
+def _incref(digest: str) -> bool:
+    res = db.session.execute(
+        sa.update(Blob).where(Blob.hash == digest).values(refcount=Blob.refcount + 1)
+    )
+    db.session.commit()
+    return res.rowcount > 0
+
+
+def release(runs, stats: dict) -> list:
+    """Quita las referencias de runs (filas con content_hash y screenshot_path).
+
+    Debe llamarse dentro de la misma transaccion que borra esos runs, antes del
+    commit: los blobs que quedan sin referencias se borran (fila y fichero)
+    mientras se tiene el bloqueo de escritura. Devuelve las rutas de los runs
+    que no estan en el almacen (capturas antiguas, un fichero por run).
+    """
+    refs = Counter(r.content_hash for r in runs if r.content_hash)
+    known = {}
+    if refs:
+        known = dict(db.session.query(Blob.hash, Blob.path).filter(Blob.hash.in_(list(refs))).all())
+
+    loose = []
+    counts = Counter()
+    for r in runs:
+        if r.content_hash in known and known[r.content_hash] == r.screenshot_path:
+            counts[r.content_hash] += 1
+        elif r.screenshot_path:
+            loose.append(r.screenshot_path)
+
+    if not counts:
+        return loose
+    for digest, n in counts.items():
+        db.session.execute(
+            sa.update(Blob).where(Blob.hash == digest).values(refcount=Blob.refcount - n)
+        )
+    dead = (
+        db.session.query(Blob.hash, Blob.path, Blob.size)
+        .filter(Blob.hash.in_(list(counts)), Blob.refcount <= 0)
+        .all()
+    )
+    if dead:
+        db.session.query(Blob).filter(Blob.hash.in_([d.hash for d in dead])).delete(synchronize_session=False)
+        db.session.flush()
+        for d in dead:
+            try:
+                os.remove(d.path)
+            except OSError:
+                continue
+            stats["files_removed"] += 1
+            stats["bytes_reclaimed"] += d.size or 0
+    return loose
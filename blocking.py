@@ -0,0 +1,112 @@
+import json
+from collections import OrderedDict
+
+# Bloqueo de recursos durante la captura (DevTools Network.setBlockedURLs).
+# Los patrones usan * como comodin y se comparan con la URL completa.
+
+# setBlockedURLs no filtra por tipo de recurso: cada tipo se traduce a sus extensiones
+RESOURCE_TYPE_EXTENSIONS = {
+    "font": ["woff", "woff2", "ttf", "otf", "eot"],
+    "media": ["mp4", "webm", "ogg", "ogv", "mp3", "m3u8", "mov"],
+    "image": ["png", "jpg", "jpeg", "gif", "webp", "avif", "svg", "ico"],
+}
+
+
+def _path_patterns(extensions) -> list:
+    # La extension tiene que cerrar la ruta (con o sin query): asi
+    # "*.webm*" no bloquea hosts como cdn.webm.example.com
+    patterns = []
+    for ext in extensions:
+        patterns += [f"*://*/*.{ext}", f"*://*/*.{ext}?*"]
+    return patterns
+
+
+RESOURCE_TYPE_PATTERNS = {rtype: _path_patterns(exts) for rtype, exts in RESOURCE_TYPE_EXTENSIONS.items()}
+
+# Analitica, publicidad y widgets de chat habituales
+DEFAULT_BLOCKLIST = [
+    "*google-analytics.com*",
+    "*googletagmanager.com*",
+    "*doubleclick.net*",
+    "*googlesyndication.com*",
+    "*adservice.google.*",
+    "*facebook.net*",
+    "*connect.facebook.net*",
+    "*hotjar.com*",
+    "*clarity.ms*",
+    "*segment.io*",
+    "*mixpanel.com*",
+    "*scorecardresearch.com*",
+    "*taboola.com*",
+    "*outbrain.com*",
+    "*criteo.com*",
+    "*intercom.io*",
+    "*widget.intercom.io*",
+    "*crisp.chat*",
+    "*tawk.to*",
+    "*zopim.com*",
+    "*zdassets.com*",
+    "*livechatinc.com*",
+    "*drift.com*",
+]
+
+
+def parse_resource_types(csv_text) -> list:
+    return [x.strip().lower() for x in (csv_text or "").split(",") if x.strip().lower() in RESOURCE_TYPE_PATTERNS]
+
+
+def patterns_for(task, default_blocklist=()) -> list:
+    patterns = []
+    for rtype in parse_resource_types(task.block_resource_types):
+        patterns.extend(RESOURCE_TYPE_PATTERNS[rtype])
+    for line in (task.block_patterns or "").splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        # un dominio suelto bloquea todo lo que venga de el
+        if "*" not in line and "/" not in line:
+            line = f"*{line}*"
+        patterns.append(line)
+    if task.use_default_blocklist:
+        patterns.extend(default_blocklist)
+    return list(dict.fromkeys(patterns))
+
+
+# Tamaño (bytes transferidos) visto por ultima vez para cada URL descargada.
+# Sirve para estimar lo que se ahorra al bloquearla en capturas posteriores.
+_KNOWN_SIZES_MAX = 5000
+_known_sizes = OrderedDict()
+
+
+def summarize_network_log(entries) -> dict:
+    """Resume el log "performance" de chromedriver de una captura."""
+    urls = {}
+    blocked = []
+    transferred = 0
+    for entry in entries:
+        try:
+            msg = json.loads(entry["message"])["message"]
+        except (KeyError, TypeError, ValueError):
+            continue
+        method = msg.get("method")
+        params = msg.get("params") or {}
+        rid = params.get("requestId")
+        if method == "Network.requestWillBeSent":
+            urls[rid] = (params.get("request") or {}).get("url")
+        elif method == "Network.loadingFinished":
+            size = int(params.get("encodedDataLength") or 0)
+            transferred += size
+            url = urls.get(rid)
+            if url:
+                _known_sizes[url] = size
+                _known_sizes.move_to_end(url)
+                while len(_known_sizes) > _KNOWN_SIZES_MAX:
+                    _known_sizes.popitem(last=False)
+        elif method == "Network.loadingFailed" and params.get("blockedReason") == "inspector":
+            blocked.append(urls.get(rid))
+
+    return {
+        "blocked_requests": len(blocked),
+        "bytes_saved": sum(_known_sizes.get(u, 0) for u in blocked if u),
+        "transfer_bytes": transferred,
+    }
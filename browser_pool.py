@@ -0,0 +1,272 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+log = logging.getLogger(__name__)
+
+
+def process_tree_rss(root_pid: int) -> int:
+    """RSS total (bytes) de un proceso y todos sus descendientes, leyendo /proc."""
+    children = {}
+    rss_pages = {}
+    try:
+        pids = [p for p in os.listdir("/proc") if p.isdigit()]
+    except OSError:
+        return 0
+    for p in pids:
+        try:
+            with open(f"/proc/{p}/stat", "r") as f:
+                stat = f.read()
+            # el nombre del proceso va entre parentesis y puede contener espacios
+            fields = stat[stat.rfind(")") + 2:].split()
+            ppid = int(fields[1])
+            rss_pages[int(p)] = int(fields[21])
+            children.setdefault(ppid, []).append(int(p))
+        except (OSError, ValueError, IndexError):
+            continue
+
+    page = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+    total = 0
+    stack = [root_pid]
+    seen = set()
+    while stack:
+        pid = stack.pop()
+        if pid in seen:
+            continue
+        seen.add(pid)
+        total += rss_pages.get(pid, 0) * page
+        stack.extend(children.get(pid, []))
+    return total
+
+
+def driver_pid(driver):
+    try:
+        return driver.service.process.pid
+    except Exception:
+        return None
+
+
+def _origin(url: str):
+    try:
+        parts = urlsplit(url or "")
+    except ValueError:
+        return None
+    if parts.scheme not in ("http", "https") or not parts.netloc:
+        return None
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+class _Slot:
+    def __init__(self, driver, number: int, cache_gen: int):
+        self.driver = driver
+        self.number = number
+        self.cache_gen = cache_gen
+        self.uses = 0
+        self.created_at = time.time()
+        self.origins = set()
+        self.broken = False
+
+
+class BrowserPool:
+    """Pool de drivers Chromium de larga vida.
+
+    Cada captura toma un driver con acquire(), trabaja sobre una pestaña limpia y
+    al devolverlo se borran cookies/almacenamiento de los origenes visitados. Un
+    driver se recicla al superar max_uses o max_rss_mb y se sustituye si se cae.
+
+    factory(n) arranca el navegador del hueco n (0..size-1); el numero se
+    mantiene al reciclar, asi cada hueco conserva su cache de disco.
+    """
+
+    def __init__(self, factory, size: int = 2, max_uses: int = 50, max_rss_mb: int = 1024,
+                 acquire_timeout: int = 300):
+        self.factory = factory
+        self.size = max(1, int(size))
+        self.max_uses = int(max_uses or 0)
+        self.max_rss_bytes = int(max_rss_mb or 0) * 1024 * 1024
+        self.acquire_timeout = acquire_timeout
+
+        self._idle = []
+        self._busy = 0
+        self._free_numbers = list(range(self.size))
+        self._cache_gen = 0
+        self._cond = threading.Condition()
+        self._closed = False
+
+    # -------- API --------
+
+    @contextmanager
+    def acquire(self):
+        slot = self._checkout()
+        try:
+            self._open_clean_tab(slot)
+            yield slot.driver
+        except Exception:
+            if not self._is_alive(slot.driver):
+                slot.broken = True
+            raise
+        finally:
+            self._checkin(slot)
+
+    def warm(self):
+        """Arranca en segundo plano los navegadores que falten hasta llenar el pool."""
+        def _run():
+            slots = []
+            try:
+                for _ in range(self.size):
+                    with self._cond:
+                        if self._closed or self._busy + len(self._idle) >= self.size:
+                            break
+                    slots.append(self._checkout())
+            except Exception:
+                log.warning("No se pudo precalentar el pool de navegadores", exc_info=True)
+            for slot in slots:
+                with self._cond:
+                    self._busy -= 1
+                    if self._closed:
+                        self._quit(slot)
+                    else:
+                        self._idle.append(slot)
+                    self._cond.notify()
+
+        threading.Thread(target=_run, name="browser-pool-warm", daemon=True).start()
+
+    def purge_cache(self):
+        """Marca la cache HTTP de todos los navegadores para vaciarla en su proximo uso."""
+        with self._cond:
+            self._cache_gen += 1
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "size": self.size,
+                "idle": len(self._idle),
+                "busy": self._busy,
+            }
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for slot in idle:
+            self._quit(slot)
+
+    # -------- internos --------
+
+    def _checkout(self) -> _Slot:
+        deadline = time.time() + self.acquire_timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("El pool de navegadores esta cerrado")
+                if self._idle:
+                    slot = self._idle.pop()
+                    self._busy += 1
+                    return slot
+                if self._busy + len(self._idle) < self.size:
+                    self._busy += 1
+                    number = self._free_numbers.pop(0)
+                    cache_gen = self._cache_gen
+                    break
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise RuntimeError("Timeout esperando un navegador libre del pool")
+                self._cond.wait(remaining)
+
+        # arrancar Chromium fuera del lock
+        try:
+            return _Slot(self.factory(number), number, cache_gen)
+        except Exception:
+            with self._cond:
+                self._busy -= 1
+                self._free_numbers.append(number)
+                self._cond.notify()
+            raise
+
+    def _checkin(self, slot: _Slot):
+        slot.uses += 1
+        recycle = slot.broken or not self._is_alive(slot.driver)
+        if not recycle:
+            try:
+                self._clean(slot)
+            except Exception:
+                recycle = True
+        if not recycle and self.max_uses and slot.uses >= self.max_uses:
+            recycle = True
+        if not recycle and self.max_rss_bytes:
+            pid = driver_pid(slot.driver)
+            if pid and process_tree_rss(pid) > self.max_rss_bytes:
+                recycle = True
+
+        # el hueco sigue contando como ocupado hasta que el navegador viejo
+        # ha terminado, para que el nuevo no comparta su cache de disco
+        if recycle:
+            self._quit(slot)
+
+        with self._cond:
+            self._busy -= 1
+            closed = self._closed
+            if recycle:
+                self._free_numbers.append(slot.number)
+            elif not closed:
+                self._idle.append(slot)
+            self._cond.notify()
+
+        if not recycle and closed:
+            self._quit(slot)
+
+    def _open_clean_tab(self, slot: _Slot):
+        driver = slot.driver
+        with self._cond:
+            cache_gen = self._cache_gen
+        if slot.cache_gen != cache_gen:
+            driver.execute_cdp_cmd("Network.clearBrowserCache", {})
+            slot.cache_gen = cache_gen
+        old_handles = list(driver.window_handles)
+        driver.switch_to.new_window("tab")
+        fresh = driver.current_window_handle
+        for h in old_handles:
+            if h == fresh:
+                continue
+            try:
+                driver.switch_to.window(h)
+                driver.close()
+            except Exception:
+                pass
+        driver.switch_to.window(fresh)
+
+    def _clean(self, slot: _Slot):
+        driver = slot.driver
+        origin = _origin(driver.current_url)
+        if origin:
+            slot.origins.add(origin)
+        driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+        for o in slot.origins:
+            driver.execute_cdp_cmd(
+                "Storage.clearDataForOrigin",
+                {
+                    "origin": o,
+                    "storageTypes": "local_storage,indexeddb,websql,service_workers,cache_storage,file_systems",
+                },
+            )
+        slot.origins.clear()
+        driver.get("about:blank")
+
+    @staticmethod
+    def _is_alive(driver) -> bool:
+        try:
+            driver.window_handles
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _quit(slot: _Slot):
+        try:
+            slot.driver.quit()
+        except Exception:
+            log.warning("No se pudo cerrar un navegador del pool", exc_info=True)
@@ -1,6 +1,9 @@
-import json
+import base64
+import math
 import os
 import time
+from io import BytesIO
+from contextlib import contextmanager
 from datetime import datetime
 
 from selenium import webdriver
@@ -10,9 +13,72 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.by import By
 
-def capture_screenshot(task, chrome_bin: str, chromedriver_bin: str, captures_dir: str) -> str:
-    os.makedirs(captures_dir, exist_ok=True)
+from PIL import Image
+
+from imaging import encode_image
+from prep import load_prep
+from blocking import patterns_for, summarize_network_log
+from metrics import timed
+from browser_pool import driver_pid
+
+# Pagina completa: altura maxima capturada y alto de cada tramo (px CSS).
+# Limitan la memoria de Chromium y del lienzo final por alta que sea la pagina.
+FULL_PAGE_MAX_HEIGHT = int(os.getenv("FULL_PAGE_MAX_HEIGHT", "30000"))
+FULL_PAGE_TILE_HEIGHT = int(os.getenv("FULL_PAGE_TILE_HEIGHT", "4000"))
+
+# Esperas "inteligentes": se captura en cuanto la pagina se estabiliza y
+# wait_seconds pasa a ser solo el maximo
+SETTLE_MODES = ("NETWORK_IDLE", "DOM_STABLE")
+SETTLE_QUIET_MS = 500
+SETTLE_POLL_SECONDS = 0.1
+
+# Se inyecta antes de cargar la pagina: cuenta peticiones fetch/XHR en vuelo y
+# apunta la ultima actividad de red (PerformanceObserver) y del DOM (MutationObserver)
+_SETTLE_TRACKER_JS = """
+(() => {
+  if (window.__wsSettle) return;
+  const s = window.__wsSettle = {inflight: 0, lastNet: performance.now(), lastDom: performance.now()};
+  const net = () => { s.lastNet = performance.now(); };
+  if (window.fetch) {
+    const origFetch = window.fetch;
+    window.fetch = function() {
+      s.inflight++; net();
+      return origFetch.apply(this, arguments).finally(() => { s.inflight--; net(); });
+    };
+  }
+  const origSend = XMLHttpRequest.prototype.send;
+  XMLHttpRequest.prototype.send = function() {
+    s.inflight++; net();
+    this.addEventListener('loadend', () => { s.inflight--; net(); });
+    return origSend.apply(this, arguments);
+  };
+  try { new PerformanceObserver(net).observe({type: 'resource', buffered: true}); } catch (e) {}
+  new MutationObserver(() => { s.lastDom = performance.now(); })
+    .observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+})();
+"""
+
+_SETTLE_STATE_JS = """
+const s = window.__wsSettle;
+if (!s) return null;
+const now = performance.now();
+return {complete: document.readyState === 'complete', inflight: s.inflight,
+        netIdle: now - s.lastNet, domIdle: now - s.lastDom};
+"""
 
+def _wait_until_settled(driver, mode: str, timeout: int):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        st = driver.execute_script(_SETTLE_STATE_JS)
+        if st and st["complete"]:
+            net_idle = st["inflight"] <= 0 and st["netIdle"] >= SETTLE_QUIET_MS
+            dom_idle = st["domIdle"] >= SETTLE_QUIET_MS
+            if (mode == "NETWORK_IDLE" and net_idle) or (mode == "DOM_STABLE" and dom_idle):
+                return
+        time.sleep(SETTLE_POLL_SECONDS)
+
+def build_driver(chrome_bin: str, chromedriver_bin: str, width: int = 1920, height: int = 1080,
+                 cache_dir=None, cache_size_mb: int = 0):
     opts = Options()
     opts.binary_location = chrome_bin
     opts.add_argument("--headless=new")
@@ -20,93 +86,221 @@ def capture_screenshot(task, chrome_bin: str, chromedriver_bin: str, captures_di
     opts.add_argument("--no-sandbox")
     opts.add_argument("--disable-dev-shm-usage")
     opts.add_argument("--hide-scrollbars")
-    opts.add_argument(f"--window-size={task.viewport_width},{task.viewport_height}")
+    opts.add_argument(f"--window-size={width},{height}")
+    # log de red de DevTools: peticiones bloqueadas y bytes transferidos por captura
+    opts.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    if cache_dir:
+        # cache HTTP persistente: sobrevive al perfil temporal de cada arranque
+        opts.add_argument(f"--disk-cache-dir={cache_dir}")
+        if cache_size_mb:
+            opts.add_argument(f"--disk-cache-size={int(cache_size_mb) * 1024 * 1024}")
 
     service = Service(chromedriver_bin)
-    driver = webdriver.Chrome(service=service, options=opts)
+    return webdriver.Chrome(service=service, options=opts)
 
+@contextmanager
+def _cold_driver(task, chrome_bin: str, chromedriver_bin: str, cache_dir=None, cache_size_mb: int = 0):
+    driver = build_driver(
+        chrome_bin, chromedriver_bin, task.viewport_width, task.viewport_height, cache_dir, cache_size_mb
+    )
     try:
-        driver.get(task.url)
+        yield driver
+    finally:
+        driver.quit()
+
+def capture_screenshot(task, chrome_bin: str, chromedriver_bin: str, captures_dir: str, pool=None,
+                       stats=None, blocklist=(), cache_dir=None, cache_size_mb: int = 0, phases=None,
+                       ticket=None) -> str:
+    """Captura task.url y devuelve la ruta del fichero.
+
+    Si se pasa stats (dict) se rellena con datos de la captura, p.ej. wait_ms.
+    blocklist son los patrones globales que se aplican si la tarea los usa.
+    cache_dir/cache_size_mb: cache HTTP de disco para el navegador sin pool (los
+    del pool ya arrancan con la suya).
+    phases (dict): ms por fase (browser, navigate, wait, prep, screenshot, encode).
+    ticket (admission.Ticket): se le asocia el navegador para medir su memoria.
+    """
+    os.makedirs(captures_dir, exist_ok=True)
+    if stats is None:
+        stats = {}
+
+    if pool is None:
+        lease = _cold_driver(task, chrome_bin, chromedriver_bin, cache_dir, cache_size_mb)
+    else:
+        lease = pool.acquire()
+
+    t_lease = time.perf_counter()
+    with lease as driver:
+        # arranque del navegador o espera a uno libre del pool
+        if phases is not None:
+            phases["browser"] = int((time.perf_counter() - t_lease) * 1000)
+        if ticket is not None:
+            ticket.attach(driver_pid(driver), fresh=pool is None)
+        # comandos CDP que deshacen lo que la tarea cambio en el navegador
+        undo = []
+        try:
+            if pool is not None:
+                driver.set_window_size(task.viewport_width, task.viewport_height)
+            return _capture_with_driver(driver, task, captures_dir, stats, undo, blocklist, phases)
+        finally:
+            if pool is not None:
+                _undo(driver, undo)
+
+def _scale_factor(task) -> float:
+    try:
+        dsf = float(task.device_scale_factor or 1.0)
+    except (TypeError, ValueError):
+        return 1.0
+    return min(4.0, max(0.25, dsf))
+
+def _apply_emulation(driver, task, undo: list):
+    dsf = _scale_factor(task)
+    if abs(dsf - 1.0) < 1e-6:
+        return
+    driver.execute_cdp_cmd(
+        "Emulation.setDeviceMetricsOverride",
+        {
+            "width": int(task.viewport_width),
+            "height": int(task.viewport_height),
+            "deviceScaleFactor": dsf,
+            "mobile": False,
+        },
+    )
+    undo.append(("Emulation.clearDeviceMetricsOverride", {}))
+
+def _undo(driver, undo: list):
+    # El driver vuelve al pool: quitar lo que haya cambiado esta tarea
+    for cmd, params in reversed(undo):
+        try:
+            driver.execute_cdp_cmd(cmd, params)
+        except Exception:
+            pass
 
-        # Zoom via CSS si aplica
-        if task.css_zoom and abs(task.css_zoom - 1.0) > 1e-6:
-            driver.execute_script(f"document.body.style.zoom = '{task.css_zoom}';")
+def _read_network_log(driver):
+    try:
+        return driver.get_log("performance")
+    except Exception:
+        return []
+
+def _capture_with_driver(driver, task, captures_dir: str, stats: dict, undo: list, blocklist=(),
+                         phases=None) -> str:
+    _apply_emulation(driver, task, undo)
+
+    if not task.use_disk_cache:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setCacheDisabled", {"cacheDisabled": True})
+        undo.append(("Network.setCacheDisabled", {"cacheDisabled": False}))
 
-        # Pre JS
-        if task.pre_js:
-            driver.execute_script(task.pre_js)
+    # descartar el log de red de capturas anteriores (driver del pool)
+    _read_network_log(driver)
+    patterns = patterns_for(task, blocklist)
+    if patterns:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+        undo.append(("Network.setBlockedURLs", {"urls": []}))
+
+    wait_mode = (task.wait_mode or "SLEEP").upper()
+    if wait_mode in SETTLE_MODES:
+        res = driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": _SETTLE_TRACKER_JS})
+        undo.append(("Page.removeScriptToEvaluateOnNewDocument", {"identifier": res["identifier"]}))
+
+    with timed(phases, "navigate"):
+        driver.get(task.url)
 
-        # Wait
-        if task.wait_mode == "SELECTOR" and task.wait_selector:
+    # Preparacion compilada al guardar la tarea: zoom + pre_js en un solo script
+    prep = load_prep(task)
+    if prep["pre"]:
+        with timed(phases, "prep"):
+            driver.execute_script(prep["pre"])
+
+    # Wait
+    t_wait = time.time()
+    with timed(phases, "wait"):
+        if wait_mode == "SELECTOR" and task.wait_selector:
             WebDriverWait(driver, max(1, int(task.wait_seconds))).until(
                 EC.presence_of_element_located((By.CSS_SELECTOR, task.wait_selector))
             )
+        elif wait_mode in SETTLE_MODES:
+            _wait_until_settled(driver, wait_mode, max(1, int(task.wait_seconds)))
         else:
             time.sleep(max(0, int(task.wait_seconds)))
+    stats["wait_ms"] = int((time.time() - t_wait) * 1000)
 
-        # Remove selectors
-        raw_selectors = []
-        try:
-            raw_selectors = json.loads(task.remove_selectors or "[]")
-        except Exception:
-            raw_selectors = []
-
-        actions = []
-        for item in raw_selectors:
-            if isinstance(item, str):
-                sel = item.strip()
-                if sel:
-                    actions.append({"selector": sel, "action": "remove"})
-            elif isinstance(item, dict):
-                sel = str(item.get("selector", "")).strip()
-                action = str(item.get("action", "remove")).strip().lower() or "remove"
-                if sel:
-                    actions.append({"selector": sel, "action": action})
-
-        for entry in actions:
-            sel = entry["selector"]
-            action = entry["action"]
-            if action == "remove":
-                driver.execute_script(
-                    "document.querySelectorAll(arguments[0]).forEach(el => el.remove());",
-                    sel,
-                )
-            elif action == "hide":
-                driver.execute_script(
-                    (
-                        "document.querySelectorAll(arguments[0]).forEach(el => {"
-                        "el.style.setProperty('display','none','important');"
-                        "el.style.setProperty('visibility','hidden','important');"
-                        "el.style.setProperty('opacity','0','important');"
-                        "el.style.setProperty('pointer-events','none','important');"
-                        "});"
-                    ),
-                    sel,
-                )
-            elif action == "click":
-                driver.execute_script(
-                    (
-                        "document.querySelectorAll(arguments[0]).forEach(el => {"
-                        "try { el.click(); } catch(e) {}"
-                        "});"
-                    ),
-                    sel,
-                )
-            else:
-                driver.execute_script(
-                    "document.querySelectorAll(arguments[0]).forEach(el => el.remove());",
-                    sel,
-                )
+    # Acciones remove/hide/click en un solo script, que ademas espera dos frames
+    # para que se pinten los cambios antes de la captura
+    with timed(phases, "prep"):
+        counts = driver.execute_async_script(
+            "const done = arguments[arguments.length - 1];"
+            "const counts = (function() {\n" + (prep["post"] or "return [];") + "\n})();"
+            "requestAnimationFrame(() => requestAnimationFrame(() => done(counts)));"
+        )
+    if prep["selectors"]:
+        stats["prep_matches"] = dict(zip(prep["selectors"], counts or []))
+
+    with timed(phases, "screenshot"):
+        image = _grab_full_page(driver, task) if task.full_page else driver.get_screenshot_as_png()
+    stats.update(summarize_network_log(_read_network_log(driver)))
 
-        time.sleep(0.5)
+    with timed(phases, "encode"):
+        data, ext = encode_image(image, task.image_format, task.jpeg_quality, task.max_width)
 
         # Path
         stamp = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
-        filename = f"task{task.id}_{stamp}.png"
+        filename = f"task{task.id}_{stamp}.{ext}"
         path = os.path.join(captures_dir, filename)
 
-        # Screenshot (viewport). Full page v1: dejamos viewport grande (como tu script 1920x5000)
-        driver.save_screenshot(path)
-        return path
-    finally:
-        driver.quit()
+        with open(path, "wb") as f:
+            f.write(data)
+    return path
+
+def _cdp_screenshot(driver, y: int, width: int, height: int) -> bytes:
+    res = driver.execute_cdp_cmd(
+        "Page.captureScreenshot",
+        {
+            "format": "png",
+            "captureBeyondViewport": True,
+            "clip": {"x": 0, "y": y, "width": width, "height": height, "scale": 1},
+        },
+    )
+    return base64.b64decode(res["data"])
+
+def _grab_full_page(driver, task):
+    """Captura el documento entero via DevTools.
+
+    Si cabe en un tramo se hace un unico Page.captureScreenshot; si no, se
+    capturan tramos de FULL_PAGE_TILE_HEIGHT y se pegan en un lienzo (reducido
+    a max_width tramo a tramo), asi solo hay un tramo decodificado a la vez.
+    """
+    metrics = driver.execute_cdp_cmd("Page.getLayoutMetrics", {})
+    content = metrics.get("cssContentSize") or metrics["contentSize"]
+    width = int(task.viewport_width or math.ceil(content["width"]))
+    height = max(1, min(math.ceil(content["height"]), FULL_PAGE_MAX_HEIGHT))
+
+    if height <= FULL_PAGE_TILE_HEIGHT:
+        return _cdp_screenshot(driver, 0, width, height)
+
+    canvas = None
+    scale = 1.0
+    y = 0
+    offset = 0
+    while y < height:
+        h = min(FULL_PAGE_TILE_HEIGHT, height - y)
+        with Image.open(BytesIO(_cdp_screenshot(driver, y, width, h))) as tile:
+            tile = tile.convert("RGB")
+            if canvas is None:
+                # el primer tramo fija la escala real (device scale factor)
+                scale = tile.width / width
+                out_w = tile.width
+                if task.max_width and tile.width > int(task.max_width):
+                    out_w = int(task.max_width)
+                ratio = out_w / tile.width
+                canvas = Image.new("RGB", (out_w, max(1, round(height * scale * ratio))), "white")
+            if canvas.width != tile.width:
+                tile = tile.resize(
+                    (canvas.width, max(1, round(tile.height * canvas.width / tile.width))),
+                    Image.LANCZOS,
+                )
+            canvas.paste(tile, (0, offset))
+            offset += tile.height
+        y += h
+    return canvas
@@ -0,0 +1,90 @@
+import hashlib
+import json
+import threading
+import time
+
+# Campos de Task que cambian el resultado de la captura. Dos tareas con los
+# mismos valores (aunque difieran en destinatarios o plantillas) comparten render.
+CAPTURE_FIELDS = (
+    "url",
+    "viewport_width",
+    "viewport_height",
+    "full_page",
+    "device_scale_factor",
+    "wait_mode",
+    "wait_seconds",
+    "wait_selector",
+    "prep_script",  # css_zoom + pre_js + remove_selectors compilados
+    "image_format",
+    "jpeg_quality",
+    "max_width",
+    "block_resource_types",
+    "block_patterns",
+    "use_default_blocklist",
+    "use_disk_cache",
+)
+
+
+def capture_key(task) -> str:
+    data = {f: getattr(task, f, None) for f in CAPTURE_FIELDS}
+    raw = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class CaptureCoalescer:
+    """Una sola captura en vuelo por clave (singleflight) + cache corta de resultados.
+
+    run(key, fn) ejecuta fn() si nadie esta capturando ya esa clave; si no,
+    espera al que lo esta haciendo y devuelve su resultado. Durante ttl segundos
+    el resultado se sirve sin volver a capturar, salvo con fresh=True (ejecuciones
+    manuales: se unen a una captura en vuelo pero no reciben una ya hecha).
+    Devuelve (resultado, compartido). Con enabled=False siempre ejecuta fn().
+    """
+
+    def __init__(self, ttl: int = 30, enabled: bool = True):
+        self.ttl = ttl
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._recent = {}  # key -> (timestamp, resultado)
+
+    def run(self, key: str, fn, is_valid=None, fresh=False):
+        if not self.enabled:
+            return fn(), False
+        with self._lock:
+            hit = None if fresh else self._recent.get(key)
+            if hit and time.time() - hit[0] < self.ttl and (is_valid is None or is_valid(hit[1])):
+                return hit[1], True
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._inflight[key] = call
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+                if call.error is None and self.ttl > 0:
+                    now = time.time()
+                    self._recent = {k: v for k, v in self._recent.items() if now - v[0] < self.ttl}
+                    self._recent[key] = (now, call.result)
+            call.done.set()
+        return call.result, False
@@ -0,0 +1,55 @@
+import sqlalchemy as sa
+from sqlalchemy.engine import make_url
+
+# Conexion a la base de datos.
+#
+# Por defecto SQLite en DATA_DIR; DATABASE_URL permite otro motor (p.ej.
+# postgresql+psycopg://...). En SQLite cada conexion nueva pasa a WAL: las
+# lecturas (web) no esperan a las escrituras (worker) y solo los escritores
+# se turnan, esperando hasta busy_timeout en vez de fallar con
+# "database is locked".
+
+
+def is_sqlite(uri: str) -> bool:
+    return make_url(uri).get_backend_name() == "sqlite"
+
+
+def engine_options(config) -> dict:
+    """SQLALCHEMY_ENGINE_OPTIONS a partir de la configuracion (pool de conexiones)."""
+    uri = config["SQLALCHEMY_DATABASE_URI"]
+    url = make_url(uri)
+    if is_sqlite(uri) and url.database in (None, "", ":memory:"):
+        # en memoria: una sola conexion compartida, sin pool configurable
+        return {}
+    options = {
+        "pool_size": config["DB_POOL_SIZE"],
+        "max_overflow": config["DB_MAX_OVERFLOW"],
+        "pool_timeout": config["DB_POOL_TIMEOUT"],
+    }
+    if is_sqlite(uri):
+        options["connect_args"] = {"timeout": config["SQLITE_BUSY_TIMEOUT_MS"] / 1000.0}
+    else:
+        # los servidores cierran conexiones inactivas: comprobar antes de usarlas
+        options["pool_pre_ping"] = True
+        options["pool_recycle"] = config["DB_POOL_RECYCLE"]
+    return options
+
+
+def configure_engine(engine, config):
+    """Ajustes por conexion; en SQLite, WAL + synchronous=NORMAL + busy_timeout."""
+    if engine.dialect.name != "sqlite":
+        return
+    busy_timeout = int(config["SQLITE_BUSY_TIMEOUT_MS"])
+
+    @sa.event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_conn, _record):
+        cur = dbapi_conn.cursor()
+        try:
+            cur.execute("PRAGMA journal_mode=WAL")
+            # con WAL, NORMAL no pierde integridad; solo puede perder la ultima
+            # transaccion si se va la luz
+            cur.execute("PRAGMA synchronous=NORMAL")
+            cur.execute(f"PRAGMA busy_timeout={busy_timeout}")
+        finally:
+            cur.close()
+
@@ -0,0 +1,111 @@
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+
+from models import db, Task, Run, DigestBatch
+from run_queue import PRIORITY_SCHEDULED
+
+# Grupos de resumen: varias tareas, un solo correo.
+#
+# Cuando salta el job de un grupo se crea un DigestBatch y un Run DIGEST por
+# cada tarea activa del grupo; los workers los capturan en paralelo como
+# cualquier otro run, pero sin enviar nada. El que termina el ultimo run del
+# lote lo reclama (PENDING -> SENDING, un solo UPDATE) y manda un unico correo
+# con todas las capturas que han cambiado. Si ese worker muere enviando, el lote
+# vuelve a PENDING pasado el plazo (reclaim_stuck) y se reintenta.
+
+UNFINISHED = ("QUEUED", "RUNNING")
+
+
+def enqueue_digest(group):
+    """Crea el lote del grupo con sus runs en cola. None si no hay nada que hacer.
+
+    Igual que las ejecuciones programadas de una tarea, no se acumulan: si el
+    lote anterior del grupo sigue capturando, se salta este.
+    """
+    busy = (
+        db.session.query(Run.id)
+        .join(DigestBatch, Run.digest_batch_id == DigestBatch.id)
+        .filter(DigestBatch.group_id == group.id, DigestBatch.state == "PENDING", Run.status.in_(UNFINISHED))
+        .first()
+    )
+    if busy is not None:
+        return None
+
+    tasks = Task.query.filter_by(digest_group_id=group.id, enabled=True).order_by(Task.id).all()
+    if not tasks:
+        return None
+
+    batch = DigestBatch(group_id=group.id, state="PENDING", created_at=datetime.utcnow())
+    db.session.add(batch)
+    db.session.flush()
+    now = datetime.utcnow()
+    for t in tasks:
+        db.session.add(
+            Run(
+                task_id=t.id,
+                trigger="DIGEST",
+                started_at=now,
+                status="QUEUED",
+                priority=PRIORITY_SCHEDULED,
+                digest_batch_id=batch.id,
+            )
+        )
+    db.session.commit()
+    return batch
+
+
+def claim(batch_id: int) -> bool:
+    """True si todos los runs del lote han terminado y este proceso lo envia."""
+    unfinished = (
+        db.session.query(Run.id)
+        .filter(Run.digest_batch_id == batch_id, Run.status.in_(UNFINISHED))
+        .first()
+    )
+    if unfinished is not None:
+        return False
+    res = db.session.execute(
+        sa.update(DigestBatch)
+        .where(DigestBatch.id == batch_id, DigestBatch.state == "PENDING")
+        .values(state="SENDING", sending_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return res.rowcount > 0
+
+
+def reclaim_stuck(timeout: int) -> list:
+    """Devuelve a PENDING los lotes en SENDING desde hace mas de timeout segundos."""
+    cutoff = datetime.utcnow() - timedelta(seconds=timeout)
+    stuck = [
+        bid
+        for (bid,) in db.session.query(DigestBatch.id)
+        .filter(
+            DigestBatch.state == "SENDING",
+            sa.or_(DigestBatch.sending_at < cutoff, DigestBatch.sending_at.is_(None)),
+        )
+        .all()
+    ]
+    if stuck:
+        db.session.execute(
+            sa.update(DigestBatch)
+            .where(DigestBatch.id.in_(stuck), DigestBatch.state == "SENDING")
+            .values(state="PENDING", sending_at=None)
+            .execution_options(synchronize_session=False)
+        )
+    db.session.commit()
+    return stuck
+
+
+def ready_batches() -> list:
+    """Lotes PENDING sin runs pendientes (p.ej. el ultimo run lo cerro reclaim_expired)."""
+    unfinished = (
+        sa.select(Run.id)
+        .where(Run.digest_batch_id == DigestBatch.id, Run.status.in_(UNFINISHED))
+        .exists()
+    )
+    return [bid for (bid,) in db.session.query(DigestBatch.id).filter(DigestBatch.state == "PENDING", ~unfinished).all()]
+
+
+def batch_runs(batch_id: int) -> list:
+    return Run.query.filter(Run.digest_batch_id == batch_id).order_by(Run.task_id).all()
@@ -0,0 +1,83 @@
+import os
+import shutil
+import time
+
+# Cache HTTP persistente de Chromium (--disk-cache-dir).
+#
+# Cada navegador del pool usa su propio directorio (pool-<n>), que sobrevive a
+# los reciclados; sin pool, cada tarea usa task-<id>. Chromium limita cada
+# directorio con --disk-cache-size y expulsa por LRU dentro de el; enforce_limit()
+# limita el total borrando los directorios usados hace mas tiempo.
+
+
+def slot_dir(root: str, slot_no: int) -> str:
+    return _ensure(os.path.join(root, f"pool-{slot_no}"))
+
+
+def task_dir(root: str, task_id: int) -> str:
+    return _ensure(os.path.join(root, f"task-{task_id}"))
+
+
+def _ensure(path: str) -> str:
+    os.makedirs(path, exist_ok=True)
+    # el mtime del directorio marca el ultimo uso (para el LRU)
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+    return path
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def enforce_limit(root: str, max_bytes: int, min_idle_seconds: int = 300) -> int:
+    """Borra directorios task-* (los menos usados primero) hasta bajar de max_bytes.
+
+    Los pool-* estan abiertos por un navegador vivo y no se tocan: su tamaño ya
+    lo limita Chromium. Devuelve los bytes liberados.
+    """
+    if not max_bytes or not os.path.isdir(root):
+        return 0
+    entries = []
+    total = 0
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if not os.path.isdir(path):
+            continue
+        size = _dir_size(path)
+        total += size
+        if name.startswith("task-"):
+            entries.append((os.path.getmtime(path), path, size))
+
+    freed = 0
+    now = time.time()
+    for mtime, path, size in sorted(entries):
+        if total <= max_bytes:
+            break
+        if now - mtime < min_idle_seconds:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        freed += size
+    return freed
+
+
+def purge(root: str) -> int:
+    """Vacia la cache de las tareas. Los navegadores del pool vacian la suya via DevTools."""
+    freed = 0
+    if os.path.isdir(root):
+        for name in os.listdir(root):
+            path = os.path.join(root, name)
+            if name.startswith("task-") and os.path.isdir(path):
+                freed += _dir_size(path)
+                shutil.rmtree(path, ignore_errors=True)
+    return freed
@@ -0,0 +1,113 @@
+import base64
+from io import BytesIO
+
+from PIL import Image
+
+# formato de la tarea -> (formato Pillow, extension de fichero)
+FORMATS = {
+    "PNG": ("PNG", "png"),
+    "JPEG": ("JPEG", "jpg"),
+    "WEBP": ("WEBP", "webp"),
+}
+
+DEFAULT_QUALITY = 85
+
+# WebP no admite lados de mas de 16383 px; por encima se usa JPEG
+WEBP_MAX_SIDE = 16383
+
+
+def normalize_format(image_format) -> str:
+    fmt = (image_format or "PNG").strip().upper()
+    if fmt == "JPG":
+        fmt = "JPEG"
+    return fmt if fmt in FORMATS else "PNG"
+
+
+def encode_image(source, image_format="PNG", quality=None, max_width=None):
+    """Reescala a max_width y codifica la captura. Devuelve (bytes, extension).
+
+    source puede ser el PNG en bytes que devuelve Chromium o una imagen de
+    Pillow ya montada (captura de pagina completa por tramos).
+    """
+    fmt = normalize_format(image_format)
+    max_width = int(max_width or 0)
+
+    if isinstance(source, Image.Image):
+        return _encode(source, fmt, quality, max_width)
+
+    # PNG sin reescalar: la captura ya viene en PNG, no hay nada que hacer
+    if fmt == "PNG" and not max_width:
+        return source, FORMATS[fmt][1]
+
+    with Image.open(BytesIO(source)) as img:
+        return _encode(img, fmt, quality, max_width)
+
+
+def _encode(img, fmt: str, quality, max_width: int):
+    pil_format, ext = FORMATS[fmt]
+    q = int(quality or DEFAULT_QUALITY)
+    q = min(100, max(1, q))
+
+    if max_width and img.width > max_width:
+        height = max(1, round(img.height * max_width / img.width))
+        img = img.resize((max_width, height), Image.LANCZOS)
+
+    if fmt == "WEBP" and max(img.size) > WEBP_MAX_SIDE:
+        fmt = "JPEG"
+        pil_format, ext = FORMATS[fmt]
+
+    out = BytesIO()
+    if fmt == "JPEG":
+        img.convert("RGB").save(out, pil_format, quality=q, optimize=True, progressive=True)
+    elif fmt == "WEBP":
+        img.save(out, pil_format, quality=q, method=4)
+    else:
+        img.save(out, pil_format, optimize=False)
+    return out.getvalue(), ext
+
+
+# -------- deteccion de cambios --------
+
+SIGNATURE_SIZE = 64  # la firma es la imagen en gris reducida a 64x64
+SIGNATURE_TOLERANCE = 10  # diferencia (0-255) por celda que se considera ruido
+
+
+def image_signature(data: bytes) -> str:
+    """Firma perceptual: la captura en gris reducida a 64x64, en base64."""
+    with Image.open(BytesIO(data)) as img:
+        small = img.convert("L").resize((SIGNATURE_SIZE, SIGNATURE_SIZE), Image.BOX)
+        return base64.b64encode(small.tobytes()).decode("ascii")
+
+
+def signature_diff(a: str, b: str) -> float:
+    """Fraccion (0..1) de celdas de la firma que han cambiado mas que la tolerancia."""
+    pa = base64.b64decode(a)
+    pb = base64.b64decode(b)
+    if len(pa) != len(pb) or not pa:
+        return 1.0
+    changed = sum(1 for x, y in zip(pa, pb) if abs(x - y) > SIGNATURE_TOLERANCE)
+    return changed / len(pa)
+
+
+# -------- miniaturas --------
+
+THUMB_QUALITY = 80
+
+
+def make_thumbnail(src_path: str, width: int, max_ratio: float = 2.0) -> bytes:
+    """Miniatura JPEG de una captura: ancho width y, como mucho, width*max_ratio de alto.
+
+    Las capturas de pagina completa se recortan por arriba: en el historial
+    basta con la cabecera de la pagina.
+    """
+    with Image.open(src_path) as img:
+        img.draft("RGB", (width, width))  # JPEG: decodifica ya reducido
+        if img.width > width:
+            height = max(1, round(img.height * width / img.width))
+            img = img.resize((width, height), Image.LANCZOS)
+        max_height = int(img.width * max_ratio)
+        if img.height > max_height:
+            img = img.crop((0, 0, img.width, max_height))
+        out = BytesIO()
+        img.convert("RGB").save(out, "JPEG", quality=THUMB_QUALITY, optimize=True, progressive=True)
+        return out.getvalue()
@@ -0,0 +1,83 @@
+import json
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+
+from models import db, Lease
+
+# Leases y señales entre procesos guardados en la tabla leases.
+#
+# Un lease lo tiene un solo holder hasta expires_at; hay que renovarlo antes de
+# que caduque. Las horas son las de cada proceso (utcnow): los relojes de las
+# maquinas deben estar sincronizados con bastante menos margen que el TTL.
+#
+# Una señal es una fila "signal:<nombre>" cuyo updated_at cambia cada vez que
+# la web pide algo al worker (resincronizar, vaciar cache...).
+#
+# Una fila "state:<nombre>" guarda en payload (JSON) lo ultimo que ha publicado
+# un worker (estadisticas de la limpieza...) para que lo lea la web.
+
+
+def acquire(name: str, holder: str, ttl: int) -> bool:
+    """Toma o renueva el lease name para holder. True si lo tiene."""
+    now = datetime.utcnow()
+    res = db.session.execute(
+        sa.update(Lease)
+        .where(Lease.name == name, sa.or_(Lease.holder == holder, Lease.expires_at < now, Lease.expires_at.is_(None)))
+        .values(holder=holder, expires_at=now + timedelta(seconds=ttl), updated_at=now)
+    )
+    db.session.commit()
+    if res.rowcount:
+        return True
+    if db.session.query(Lease.name).filter(Lease.name == name).first() is not None:
+        return False
+    try:
+        db.session.add(Lease(name=name, holder=holder, expires_at=now + timedelta(seconds=ttl), updated_at=now))
+        db.session.commit()
+        return True
+    except sa.exc.IntegrityError:
+        db.session.rollback()
+        return False
+
+
+def release(name: str, holder: str):
+    db.session.execute(
+        sa.update(Lease).where(Lease.name == name, Lease.holder == holder).values(expires_at=None)
+    )
+    db.session.commit()
+
+
+def touch_signal(name: str):
+    key = f"signal:{name}"
+    now = datetime.utcnow()
+    res = db.session.execute(sa.update(Lease).where(Lease.name == key).values(updated_at=now))
+    if not res.rowcount:
+        db.session.add(Lease(name=key, updated_at=now))
+    try:
+        db.session.commit()
+    except sa.exc.IntegrityError:
+        db.session.rollback()
+        touch_signal(name)
+
+
+def signal_stamp(name: str):
+    return db.session.query(Lease.updated_at).filter(Lease.name == f"signal:{name}").scalar()
+
+
+def put_state(name: str, data: dict):
+    key = f"state:{name}"
+    now = datetime.utcnow()
+    payload = json.dumps(data)
+    res = db.session.execute(sa.update(Lease).where(Lease.name == key).values(payload=payload, updated_at=now))
+    if not res.rowcount:
+        db.session.add(Lease(name=key, payload=payload, updated_at=now))
+    try:
+        db.session.commit()
+    except sa.exc.IntegrityError:
+        db.session.rollback()
+        put_state(name, data)
+
+
+def get_state(name: str) -> dict:
+    payload = db.session.query(Lease.payload).filter(Lease.name == f"state:{name}").scalar()
+    return json.loads(payload) if payload else {}
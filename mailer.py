@@ -1,19 +1,35 @@
+import html as html_lib
 import os
 import smtplib
+import time
+from datetime import datetime
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.image import MIMEImage
 from email.utils import formatdate
 
+from metrics import timed
+
 def _split_emails(csv_text: str):
     if not csv_text:
         return []
     return [e.strip() for e in csv_text.split(",") if e.strip()]
 
-def send_email_with_screenshot(task, smtp_profile, screenshot_path: str):
+_IMAGE_SUBTYPES = {".png": "png", ".jpg": "jpeg", ".jpeg": "jpeg", ".webp": "webp"}
+
+def _image_subtype(path: str) -> str:
+    return _IMAGE_SUBTYPES.get(os.path.splitext(path)[1].lower(), "png")
+
+def _password(smtp_profile) -> str:
     password = os.getenv(smtp_profile.password_env, "")
     if not password:
         raise RuntimeError(f"No existe la variable de entorno {smtp_profile.password_env} o esta vacia")
+    return password
+
+def send_email_with_screenshot(task, smtp_profile, screenshot_path: str, pool=None, filename=None, phases=None):
+    # phases (dict): ms de construir el mensaje (mime) y de enviarlo (smtp)
+    t_mime = time.perf_counter()
+    password = _password(smtp_profile)
 
     to_list = _split_emails(task.to_emails)
     cc_list = _split_emails(task.cc_emails or "")
@@ -32,7 +48,6 @@ def send_email_with_screenshot(task, smtp_profile, screenshot_path: str):
     msg["Date"] = formatdate(localtime=True)
 
     # subject + body vars
-    from datetime import datetime
     now = datetime.now()
     subject = (task.subject_template or "Captura").format(
         task_name=task.name,
@@ -55,20 +70,123 @@ def send_email_with_screenshot(task, smtp_profile, screenshot_path: str):
     msg.attach(alt)
 
     # attach inline
+    filename = filename or os.path.basename(screenshot_path)
     with open(screenshot_path, "rb") as f:
-        img = MIMEImage(f.read(), name=os.path.basename(screenshot_path))
+        img = MIMEImage(f.read(), _subtype=_image_subtype(screenshot_path), name=filename)
     img.add_header("Content-ID", "<screenshot>")
-    img.add_header("Content-Disposition", "inline", filename=os.path.basename(screenshot_path))
+    img.add_header("Content-Disposition", "inline", filename=filename)
     msg.attach(img)
 
     # optional: also attach file (non-inline)
     if task.attach_file:
         with open(screenshot_path, "rb") as f:
-            img2 = MIMEImage(f.read(), name=os.path.basename(screenshot_path))
-        img2.add_header("Content-Disposition", "attachment", filename=os.path.basename(screenshot_path))
+            img2 = MIMEImage(f.read(), _subtype=_image_subtype(screenshot_path), name=filename)
+        img2.add_header("Content-Disposition", "attachment", filename=filename)
         msg.attach(img2)
 
-    # connect
+    msg_str = msg.as_string()
+    if phases is not None:
+        phases["mime"] = int((time.perf_counter() - t_mime) * 1000)
+
+    _deliver(smtp_profile, password, all_rcpt, msg_str, pool, phases)
+
+def _union(lists, exclude=()):
+    # sin repetir direcciones (sin distinguir mayusculas), en orden de aparicion
+    seen = {e.lower() for e in exclude}
+    out = []
+    for lst in lists:
+        for e in lst:
+            if e.lower() not in seen:
+                seen.add(e.lower())
+                out.append(e)
+    return out
+
+def send_digest_email(group, smtp_profile, items, pool=None, phases=None):
+    """Un solo correo con varias capturas inline (cid:shot-0, cid:shot-1...).
+
+    items: [(task, screenshot_path, filename)]. Va a la union de los
+    destinatarios de esas tareas, en una sola transaccion SMTP.
+    """
+    t_mime = time.perf_counter()
+    password = _password(smtp_profile)
+
+    tasks = [task for task, _path, _filename in items]
+    to_list = _union(_split_emails(t.to_emails) for t in tasks)
+    cc_list = _union((_split_emails(t.cc_emails or "") for t in tasks), exclude=to_list)
+    bcc_list = _union((_split_emails(t.bcc_emails or "") for t in tasks), exclude=to_list + cc_list)
+    all_rcpt = to_list + cc_list + bcc_list
+    if not all_rcpt:
+        raise RuntimeError("No hay destinatarios")
+
+    msg = MIMEMultipart("related")
+    msg["From"] = smtp_profile.from_email
+    msg["To"] = ", ".join(to_list)
+    if cc_list:
+        msg["Cc"] = ", ".join(cc_list)
+    if smtp_profile.reply_to:
+        msg["Reply-To"] = smtp_profile.reply_to
+    msg["Date"] = formatdate(localtime=True)
+
+    now = datetime.now()
+    msg["Subject"] = (group.subject_template or "Resumen {group_name}").format(
+        group_name=group.name,
+        date=now.strftime("%Y-%m-%d"),
+        time=now.strftime("%H:%M"),
+        count=len(items),
+    )
+
+    sections = []
+    text_lines = []
+    for i, (task, _path, _filename) in enumerate(items):
+        sections.append(
+            f"<h3>{html_lib.escape(task.name)}</h3>\n"
+            f'<p><a href="{html_lib.escape(task.url, quote=True)}">{html_lib.escape(task.url)}</a></p>\n'
+            f'<img src="cid:shot-{i}" style="max-width:100%; border:1px solid #ddd; padding:10px;"/>'
+        )
+        text_lines.append(f"{task.name}: {task.url}")
+    body = f"<html><body>\n<h2>{html_lib.escape(group.name)}</h2>\n" + "\n".join(sections) + "\n</body></html>"
+    alt = MIMEMultipart("alternative")
+    alt.attach(MIMEText("\n".join(text_lines), "plain", "utf-8"))
+    alt.attach(MIMEText(body, "html", "utf-8"))
+    msg.attach(alt)
+
+    for i, (task, path, filename) in enumerate(items):
+        filename = filename or os.path.basename(path)
+        with open(path, "rb") as f:
+            data = f.read()
+        img = MIMEImage(data, _subtype=_image_subtype(path), name=filename)
+        img.add_header("Content-ID", f"<shot-{i}>")
+        img.add_header("Content-Disposition", "inline", filename=filename)
+        msg.attach(img)
+        if task.attach_file:
+            img2 = MIMEImage(data, _subtype=_image_subtype(path), name=filename)
+            img2.add_header("Content-Disposition", "attachment", filename=filename)
+            msg.attach(img2)
+
+    msg_str = msg.as_string()
+    if phases is not None:
+        phases["mime"] = int((time.perf_counter() - t_mime) * 1000)
+
+    _deliver(smtp_profile, password, all_rcpt, msg_str, pool, phases)
+    return all_rcpt
+
+def _deliver(smtp_profile, password: str, rcpt: list, msg_str: str, pool=None, phases=None):
+    with timed(phases, "smtp"):
+        if pool is not None:
+            pool.send(smtp_profile, password, smtp_profile.from_email, rcpt, msg_str)
+            return
+
+        server = open_smtp_connection(smtp_profile, password)
+        try:
+            server.sendmail(smtp_profile.from_email, rcpt, msg_str)
+        finally:
+            try:
+                server.quit()
+            except Exception:
+                pass
+
+def open_smtp_connection(smtp_profile, password: str):
+    """Abre una sesion SMTP ya autenticada (EHLO, STARTTLS si aplica y LOGIN)."""
     enc = (smtp_profile.encryption or "STARTTLS").upper()
     host, port = smtp_profile.host, int(smtp_profile.port)
 
@@ -84,9 +202,10 @@ def send_email_with_screenshot(task, smtp_profile, screenshot_path: str):
             server.ehlo()
 
         server.login(smtp_profile.username, password)
-        server.sendmail(smtp_profile.from_email, all_rcpt, msg.as_string())
-    finally:
+    except Exception:
         try:
-            server.quit()
+            server.close()
         except Exception:
             pass
+        raise
+    return server
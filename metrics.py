@@ -0,0 +1,98 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Metricas en memoria del proceso, exportadas en /metrics en formato de texto
+# de Prometheus. Sin dependencias: histogramas y contadores minimos.
+
+PHASE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+@contextmanager
+def timed(phases, name: str):
+    """Suma a phases[name] los ms que tarda el bloque (phases puede ser None)."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        if phases is not None:
+            phases[name] = phases.get(name, 0) + int((time.perf_counter() - t0) * 1000)
+
+
+def _labels(labels: dict, extra=None) -> str:
+    items = sorted(labels.items()) + (extra or [])
+    if not items:
+        return ""
+    def esc(v):
+        return str(v).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in items) + "}"
+
+
+def _num(v) -> str:
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Metrics:
+    """Registro de histogramas y contadores con etiquetas."""
+
+    def __init__(self, buckets=PHASE_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._help = {}
+        self._hist = {}  # nombre -> {labels(tuple): [cuenta por bucket..., suma, total]}
+        self._counters = {}  # nombre -> {labels(tuple): valor}
+
+    def describe(self, name: str, text: str):
+        self._help[name] = text
+
+    def observe(self, name: str, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._hist.setdefault(name, {})
+            row = series.get(key)
+            if row is None:
+                row = series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def render(self, gauges=()) -> str:
+        """Texto para /metrics. gauges: [(nombre, ayuda, valor, {etiquetas}), ...] leidos al momento."""
+        out = []
+        with self._lock:
+            for name, series in sorted(self._hist.items()):
+                self._header(out, name, "histogram")
+                for key, row in sorted(series.items()):
+                    labels = dict(key)
+                    for b, n in zip(self.buckets, row):
+                        out.append(f"{name}_bucket{_labels(labels, [('le', _num(float(b)))])} {n}")
+                    out.append(f"{name}_bucket{_labels(labels, [('le', '+Inf')])} {row[-1]}")
+                    out.append(f"{name}_sum{_labels(labels)} {_num(round(row[-2], 6))}")
+                    out.append(f"{name}_count{_labels(labels)} {row[-1]}")
+            for name, series in sorted(self._counters.items()):
+                self._header(out, name, "counter")
+                for key, value in sorted(series.items()):
+                    out.append(f"{name}{_labels(dict(key))} {_num(value)}")
+
+        seen = set()
+        for name, text, value, labels in gauges:
+            if name not in seen:
+                seen.add(name)
+                if text:
+                    out.append(f"# HELP {name} {text}")
+                out.append(f"# TYPE {name} gauge")
+            out.append(f"{name}{_labels(labels or {})} {_num(value)}")
+        return "\n".join(out) + "\n"
+
+    def _header(self, out: list, name: str, kind: str):
+        if name in self._help:
+            out.append(f"# HELP {name} {self._help[name]}")
+        out.append(f"# TYPE {name} {kind}")
@@ -0,0 +1,149 @@
+import argparse
+import logging
+import os
+import socket
+import time
+from datetime import datetime
+
+import sqlalchemy as sa
+
+from models import db, Task, Run, SchemaMigration
+from prep import compile_prep
+from run_queue import PRIORITY_MANUAL, PRIORITY_SCHEDULED
+import leases
+
+log = logging.getLogger(__name__)
+
+# Migraciones del esquema, aplicadas al arrancar (create_app) o con
+# `python -m migrations`.
+#
+# sync_schema() crea las tablas, columnas e indices que falten: los cambios de
+# los modelos son siempre aditivos (columnas nullables). Los cambios de datos van
+# en MIGRATIONS, numerados; cada uno se aplica una sola vez y queda anotado en
+# schema_migrations. Si arrancan varios procesos a la vez, solo el que tiene el
+# lease "migrations" los aplica; los demas esperan a que termine.
+
+MIGRATION_LEASE = "migrations"
+MIGRATION_LEASE_SECONDS = 300
+
+
+def sync_schema():
+    """Crea lo que falte del esquema: tablas, columnas nuevas e indices."""
+    db.create_all()
+
+    insp = sa.inspect(db.engine)
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            existing = {c["name"] for c in insp.get_columns(table.name)}
+            for col in table.columns:
+                if col.name in existing:
+                    continue
+                col_type = col.type.compile(dialect=conn.dialect)
+                conn.execute(sa.text(f"ALTER TABLE {table.name} ADD COLUMN {col.name} {col_type}"))
+
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+
+
+def _backfill_prep_script():
+    # Tareas guardadas antes de compilar la preparacion del DOM
+    for t in Task.query.filter(Task.prep_script.is_(None)).all():
+        t.prep_script = compile_prep(t)
+
+
+def _backfill_run_priority():
+    # Runs en cola de antes de la columna priority (NULL se ordenaria primero)
+    db.session.execute(
+        sa.update(Run)
+        .where(Run.priority.is_(None))
+        .values(
+            priority=sa.case(
+                (Run.trigger == "SCHEDULED", PRIORITY_SCHEDULED),
+                else_=PRIORITY_MANUAL,
+            )
+        )
+    )
+
+
+def _analyze():
+    # estadisticas para que el planificador use los indices de runs
+    if db.engine.dialect.name in ("sqlite", "postgresql"):
+        db.session.execute(sa.text("ANALYZE"))
+
+
+MIGRATIONS = [
+    (1, "compilar prep_script de tareas antiguas", _backfill_prep_script),
+    (2, "prioridad de runs antiguos", _backfill_run_priority),
+    (3, "estadisticas de indices", _analyze),
+]
+
+def applied_versions() -> set:
+    return {v for (v,) in db.session.query(SchemaMigration.version).all()}
+
+
+def pending() -> list:
+    done = applied_versions()
+    return [m for m in MIGRATIONS if m[0] not in done]
+
+
+def upgrade(timeout: int = MIGRATION_LEASE_SECONDS + 30) -> list:
+    """Pone el esquema al dia. Devuelve las versiones aplicadas por este proceso."""
+    try:
+        sync_schema()
+    except sa.exc.DBAPIError:
+        # otro proceso ha creado la misma tabla o indice a la vez: repasar
+        db.session.rollback()
+        time.sleep(1)
+        sync_schema()
+    if not pending():
+        return []
+
+    holder = f"{socket.gethostname()}:{os.getpid()}"
+    deadline = time.time() + timeout
+    while not leases.acquire(MIGRATION_LEASE, holder, MIGRATION_LEASE_SECONDS):
+        if time.time() > deadline:
+            raise RuntimeError("Timeout esperando a que otro proceso termine las migraciones")
+        time.sleep(1)
+        if not pending():
+            return []
+
+    applied = []
+    try:
+        for version, name, fn in pending():
+            log.info("Migracion %s: %s", version, name)
+            fn()
+            db.session.add(SchemaMigration(version=version, name=name, applied_at=datetime.utcnow()))
+            db.session.commit()
+            applied.append(version)
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        leases.release(MIGRATION_LEASE, holder)
+    return applied
+
+
+def main():
+    from app import create_app
+
+    parser = argparse.ArgumentParser(prog="python -m migrations", description="Migraciones del esquema")
+    parser.add_argument("command", nargs="?", default="upgrade", choices=["upgrade", "status"])
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    # sin worker ni migracion automatica: solo la conexion
+    app = create_app({"APP_ROLE": "web", "DB_MIGRATE_ON_START": False})
+    with app.app_context():
+        if args.command == "upgrade":
+            applied = upgrade()
+            print(f"Aplicadas: {applied or 'ninguna'}")
+        sync_done = sa.inspect(db.engine).has_table(SchemaMigration.__tablename__)
+        done = applied_versions() if sync_done else set()
+        print(f"Base de datos: {db.engine.url.render_as_string(hide_password=True)}")
+        for version, name, _fn in MIGRATIONS:
+            print(f"  [{'x' if version in done else ' '}] {version} {name}")
+
+
+if __name__ == "__main__":
+    main()
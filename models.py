@@ -35,30 +35,42 @@ class Task(db.Model):
     time_hhmm = db.Column(db.String(5), nullable=True)  # "08:30"
     weekdays = db.Column(db.String(50), nullable=True)  # "1,2,3,4,5" (lun=1..dom=7)
     interval_minutes = db.Column(db.Integer, nullable=True)
+    jitter_seconds = db.Column(db.Integer, nullable=True)  # ventana de desfase; NULL = SCHEDULE_JITTER_SECONDS
 
     url = db.Column(db.Text, nullable=False)
 
     viewport_width = db.Column(db.Integer, default=1920)
-    viewport_height = db.Column(db.Integer, default=5000)
+    viewport_height = db.Column(db.Integer, default=1080)
     full_page = db.Column(db.Boolean, default=False)
 
     device_scale_factor = db.Column(db.Float, default=1.0)
     css_zoom = db.Column(db.Float, default=1.0)
 
-    wait_mode = db.Column(db.String(20), default="SLEEP")  # SLEEP|SELECTOR
+    wait_mode = db.Column(db.String(20), default="SLEEP")  # SLEEP|SELECTOR|NETWORK_IDLE|DOM_STABLE
     wait_seconds = db.Column(db.Integer, default=5)
     wait_selector = db.Column(db.String(300), nullable=True)
 
     remove_selectors = db.Column(db.Text, default="[]")  # JSON array string
     pre_js = db.Column(db.Text, nullable=True)
+    prep_script = db.Column(db.Text, nullable=True)  # zoom/pre_js/selectores compilados (prep.compile_prep)
 
-    image_format = db.Column(db.String(10), default="PNG")  # PNG|JPEG
-    jpeg_quality = db.Column(db.Integer, nullable=True)
+    block_resource_types = db.Column(db.String(100), nullable=True)  # csv: font,media,image
+    block_patterns = db.Column(db.Text, nullable=True)  # un patron/dominio por linea
+    use_default_blocklist = db.Column(db.Boolean, default=False)
+    use_disk_cache = db.Column(db.Boolean, default=False)  # reutilizar la cache HTTP entre capturas
+
+    image_format = db.Column(db.String(10), default="PNG")  # PNG|JPEG|WEBP
+    jpeg_quality = db.Column(db.Integer, nullable=True)  # calidad JPEG/WebP (1..100)
     max_width = db.Column(db.Integer, nullable=True)
 
     smtp_profile_id = db.Column(db.Integer, db.ForeignKey("smtp_profiles.id"), nullable=False)
     smtp_profile = db.relationship("SmtpProfile")
 
+    # En un grupo de resumen la tarea sale con la programacion del grupo y su
+    # captura va en un unico correo junto a las del resto (digest.py)
+    digest_group_id = db.Column(db.Integer, db.ForeignKey("digest_groups.id"), nullable=True)
+    digest_group = db.relationship("DigestGroup", back_populates="tasks")
+
     to_emails = db.Column(db.Text, nullable=False)   # csv
     cc_emails = db.Column(db.Text, nullable=True)
     bcc_emails = db.Column(db.Text, nullable=True)
@@ -76,11 +88,66 @@ class Task(db.Model):
 
     retention_days = db.Column(db.Integer, default=14)
 
+    # Solo enviar si la captura cambia respecto a la ultima enviada
+    send_only_on_change = db.Column(db.Boolean, default=False)
+    change_threshold = db.Column(db.Float, default=0.0)  # % de celdas cambiadas que se ignora
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class DigestGroup(db.Model):
+    # Varias tareas capturadas a la vez y enviadas en un solo correo
+    __tablename__ = "digest_groups"
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(160), nullable=False)
+    enabled = db.Column(db.Boolean, default=True, nullable=False)
+
+    # misma programacion que Task (scheduler.build_trigger)
+    timezone = db.Column(db.String(60), nullable=False, default="Europe/Madrid")
+    schedule_type = db.Column(db.String(20), nullable=False, default="DAILY")  # DAILY|WEEKLY|INTERVAL
+    time_hhmm = db.Column(db.String(5), nullable=True)
+    weekdays = db.Column(db.String(50), nullable=True)
+    interval_minutes = db.Column(db.Integer, nullable=True)
+    jitter_seconds = db.Column(db.Integer, nullable=True)
+
+    smtp_profile_id = db.Column(db.Integer, db.ForeignKey("smtp_profiles.id"), nullable=False)
+    smtp_profile = db.relationship("SmtpProfile")
+    subject_template = db.Column(db.String(300), default="Resumen {group_name} {date} {time}")
+
+    tasks = db.relationship("Task", back_populates="digest_group")
+
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+class DigestBatch(db.Model):
+    # Una ejecucion de un grupo: sus runs (trigger DIGEST) y el correo comun
+    __tablename__ = "digest_batches"
+
+    id = db.Column(db.Integer, primary_key=True)
+    group_id = db.Column(db.Integer, db.ForeignKey("digest_groups.id"), nullable=True)
+    group = db.relationship("DigestGroup")
+    state = db.Column(db.String(10), default="PENDING")  # PENDING|SENDING|SENT|SKIPPED|ERROR
+    sending_at = db.Column(db.DateTime, nullable=True)  # cuando paso a SENDING
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+    images = db.Column(db.Integer, nullable=True)  # capturas incluidas en el correo
+    error_message = db.Column(db.Text, nullable=True)
+
+
 class Run(db.Model):
     __tablename__ = "runs"
+    __table_args__ = (
+        # ultimo run por tarea (portada) y filtros por tarea + fecha (historial, limpieza)
+        db.Index("ix_runs_task_id_id", "task_id", "id"),
+        db.Index("ix_runs_task_id_started_at", "task_id", "started_at"),
+        # historial filtrado por estado o por rango de fechas
+        db.Index("ix_runs_status_id", "status", "id"),
+        db.Index("ix_runs_started_at", "started_at"),
+        # cola de trabajo: siguiente run QUEUED por prioridad
+        db.Index("ix_runs_status_priority_id", "status", "priority", "id"),
+        db.Index("ix_runs_digest_batch_id", "digest_batch_id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     task_id = db.Column(db.Integer, db.ForeignKey("tasks.id"), nullable=False)
@@ -89,11 +156,60 @@ class Run(db.Model):
     started_at = db.Column(db.DateTime, default=datetime.utcnow)
     finished_at = db.Column(db.DateTime, nullable=True)
 
-    status = db.Column(db.String(10), default="ERROR")  # OK|ERROR
+    status = db.Column(db.String(10), default="ERROR")  # QUEUED|RUNNING|OK|UNCHANGED|ERROR
     error_message = db.Column(db.Text, nullable=True)
 
     screenshot_path = db.Column(db.Text, nullable=True)
     image_bytes = db.Column(db.Integer, nullable=True)
+    peak_rss_mb = db.Column(db.Integer, nullable=True)  # lo que crecio el navegador durante la captura
     duration_ms = db.Column(db.Integer, nullable=True)
+    wait_ms = db.Column(db.Integer, nullable=True)  # espera real antes de capturar
+    stats_json = db.Column(db.Text, nullable=True)  # datos de la captura (elementos por selector...)
+    phases_json = db.Column(db.Text, nullable=True)  # ms por fase: queue, browser, navigate, wait, ... smtp, total
+    blocked_requests = db.Column(db.Integer, nullable=True)
+    bytes_saved = db.Column(db.Integer, nullable=True)  # estimado: tamaño conocido de lo bloqueado
+    capture_key = db.Column(db.String(40), nullable=True)  # huella de los ajustes de captura (coalesce.capture_key)
+
+    content_hash = db.Column(db.String(64), nullable=True)  # sha256 del fichero
+    image_signature = db.Column(db.Text, nullable=True)  # firma 64x64 (imaging.image_signature)
+    diff_score = db.Column(db.Float, nullable=True)  # 0..1 respecto a la ultima captura enviada
+
+    trigger = db.Column(db.String(20), default="SCHEDULED")  # SCHEDULED|MANUAL_TEST|MANUAL_CAPTURE|DIGEST
+    digest_batch_id = db.Column(db.Integer, db.ForeignKey("digest_batches.id"), nullable=True)
+
+    # Cola de trabajo entre workers (run_queue.claim_runs)
+    priority = db.Column(db.Integer, nullable=True)  # menor = antes
+    worker_id = db.Column(db.String(120), nullable=True)
+    lease_token = db.Column(db.String(32), nullable=True)
+    lease_expires_at = db.Column(db.DateTime, nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    attempts = db.Column(db.Integer, nullable=True)
+
+class Blob(db.Model):
+    # Captura almacenada por contenido (blobstore); la comparten los runs con el mismo content_hash
+    __tablename__ = "blobs"
+
+    hash = db.Column(db.String(64), primary_key=True)  # sha256
+    path = db.Column(db.Text, nullable=False)
+    size = db.Column(db.Integer, nullable=True)
+    refcount = db.Column(db.Integer, default=0, nullable=False)  # runs que lo referencian
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class Lease(db.Model):
+    # Lease entre procesos (leases.py): un solo worker programa las tareas.
+    # Tambien guarda señales y estado compartido entre la web y los workers
+    __tablename__ = "leases"
+
+    name = db.Column(db.String(80), primary_key=True)
+    holder = db.Column(db.String(120), nullable=True)
+    expires_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    payload = db.Column(db.Text, nullable=True)  # JSON de las filas "state:<nombre>"
+
+
+class SchemaMigration(db.Model):
+    __tablename__ = "schema_migrations"
 
-    trigger = db.Column(db.String(20), default="SCHEDULED")  # SCHEDULED|MANUAL_TEST|MANUAL_CAPTURE
+    version = db.Column(db.Integer, primary_key=True)  # migrations.MIGRATIONS
+    name = db.Column(db.String(200), nullable=True)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
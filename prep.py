@@ -0,0 +1,107 @@
+import json
+
+# Preparacion del DOM compilada al guardar la tarea.
+#
+# compile_prep() convierte css_zoom, pre_js y remove_selectors en dos scripts:
+# "pre" (zoom + pre_js, justo tras cargar) y "post" (acciones remove/hide/click,
+# tras la espera). Cada uno se ejecuta en un solo execute_script; "post"
+# devuelve cuantos elementos encontro cada accion (-1 si el selector es invalido).
+
+PREP_VERSION = 1
+
+_ACTION_JS = {
+    "remove": "els.forEach(el => el.remove());",
+    "hide": (
+        "els.forEach(el => {"
+        "el.style.setProperty('display','none','important');"
+        "el.style.setProperty('visibility','hidden','important');"
+        "el.style.setProperty('opacity','0','important');"
+        "el.style.setProperty('pointer-events','none','important');"
+        "});"
+    ),
+    "click": "els.forEach(el => { try { el.click(); } catch(e) {} });",
+}
+
+
+def parse_actions(remove_selectors) -> list:
+    """Normaliza remove_selectors (JSON) a [{"selector", "action"}, ...]."""
+    try:
+        raw_selectors = json.loads(remove_selectors or "[]")
+    except Exception:
+        raw_selectors = []
+    if not isinstance(raw_selectors, list):
+        return []
+
+    actions = []
+    for item in raw_selectors:
+        if isinstance(item, str):
+            sel = item.strip()
+            if sel:
+                actions.append({"selector": sel, "action": "remove"})
+        elif isinstance(item, dict):
+            sel = str(item.get("selector", "")).strip()
+            action = str(item.get("action", "remove")).strip().lower() or "remove"
+            if action not in _ACTION_JS:
+                action = "remove"
+            if sel:
+                actions.append({"selector": sel, "action": action})
+    return actions
+
+
+def _pre_script(task):
+    parts = []
+    if task.css_zoom and abs(task.css_zoom - 1.0) > 1e-6:
+        parts.append(f"document.body.style.zoom = {json.dumps(str(task.css_zoom))};")
+    if task.pre_js:
+        # mismo comportamiento que execute_script(pre_js): cuerpo de una funcion
+        parts.append("(function() {\n" + task.pre_js + "\n})();")
+    return "\n".join(parts) or None
+
+
+def _post_script(actions: list):
+    if not actions:
+        return None
+    branches = " else ".join(
+        f"if (a.action === {json.dumps(name)}) {{ {js} }}" for name, js in _ACTION_JS.items()
+    )
+    return (
+        f"const actions = {json.dumps(actions)};\n"
+        "const counts = [];\n"
+        "for (const a of actions) {\n"
+        "  let els;\n"
+        "  try { els = document.querySelectorAll(a.selector); } catch (e) { counts.push(-1); continue; }\n"
+        f"  {branches}\n"
+        "  counts.push(els.length);\n"
+        "}\n"
+        "return counts;"
+    )
+
+
+def compile_prep(task) -> str:
+    """Compila la preparacion de la tarea; se guarda en Task.prep_script."""
+    actions = parse_actions(task.remove_selectors)
+    return json.dumps(
+        {
+            "v": PREP_VERSION,
+            "pre": _pre_script(task),
+            "post": _post_script(actions),
+            "selectors": [f"{a['action']}:{a['selector']}" for a in actions],
+        }
+    )
+
+
+_cache = {}
+
+
+def load_prep(task) -> dict:
+    """Devuelve la preparacion compilada de la tarea (parseada y cacheada)."""
+    compiled = task.prep_script or compile_prep(task)
+    bundle = _cache.get(compiled)
+    if bundle is None:
+        bundle = json.loads(compiled)
+        if bundle.get("v") != PREP_VERSION:
+            bundle = json.loads(compile_prep(task))
+        if len(_cache) > 512:
+            _cache.clear()
+        _cache[compiled] = bundle
+    return bundle
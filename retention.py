@@ -0,0 +1,147 @@
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+
+import blobstore
+import disk_cache
+import leases
+import thumbs
+from models import db, Task, Run, Blob
+
+log = logging.getLogger(__name__)
+
+# Runs que aun pueden estar escribiendo su captura: no se tocan
+_ACTIVE_STATUSES = ("QUEUED", "RUNNING")
+
+
+def new_stats() -> dict:
+    return {
+        "rows_deleted": 0,
+        "files_removed": 0,
+        "orphans_removed": 0,
+        "thumbs_removed": 0,
+        "bytes_reclaimed": 0,
+        "duration_ms": 0,
+    }
+
+
+def _unlink(paths, stats: dict, key: str = "files_removed"):
+    for path in paths:
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            continue
+        stats[key] += 1
+        stats["bytes_reclaimed"] += size
+
+
+def delete_runs(criteria, stats: dict, batch_size: int = 500):
+    """Borra en lotes los runs que cumplen criteria y despues sus ficheros.
+
+    Cada lote es un DELETE ... WHERE id IN (...) con su propio commit. Los
+    blobs que se quedan sin referencias se borran dentro de la transaccion
+    (blobstore.release); los ficheros sueltos de capturas antiguas, fuera.
+    """
+    while True:
+        chunk = (
+            db.session.query(Run.id, Run.screenshot_path, Run.content_hash)
+            .filter(*criteria)
+            .order_by(Run.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not chunk:
+            return
+        ids = [r.id for r in chunk]
+        db.session.query(Run).filter(Run.id.in_(ids)).delete(synchronize_session=False)
+        loose = blobstore.release(chunk, stats)
+        db.session.commit()
+        stats["rows_deleted"] += len(ids)
+        _unlink(loose, stats)
+        if len(chunk) < batch_size:
+            return
+
+
+def remove_orphans(captures_dir: str, stats: dict, grace_seconds: int = 3600):
+    """Borra ficheros de captures_dir que ningun Run referencia.
+
+    Los ficheros recientes (grace_seconds) se respetan: pueden ser capturas
+    en curso cuyo Run todavia no tiene screenshot_path.
+    """
+    if not os.path.isdir(captures_dir):
+        return
+    referenced = set()
+    q = db.session.query(Run.screenshot_path).filter(Run.screenshot_path.isnot(None))
+    for (path,) in q.yield_per(1000):
+        referenced.add(os.path.abspath(path))
+    for (path,) in db.session.query(Blob.path).yield_per(1000):
+        referenced.add(os.path.abspath(path))
+
+    limit = time.time() - grace_seconds
+    orphans = []
+    for root, dirs, files in os.walk(captures_dir):
+        if root == captures_dir and thumbs.THUMBS_SUBDIR in dirs:
+            dirs.remove(thumbs.THUMBS_SUBDIR)  # las miniaturas se limpian aparte
+        for name in files:
+            path = os.path.abspath(os.path.join(root, name))
+            if path in referenced:
+                continue
+            try:
+                if os.path.getmtime(path) > limit:
+                    continue
+            except OSError:
+                continue
+            orphans.append(path)
+    _unlink(orphans, stats, key="orphans_removed")
+
+
+def sweep(captures_dir: str, batch_size: int = 500, orphan_grace: int = 3600) -> dict:
+    """Aplica retention_days de todas las tareas y limpia ficheros huerfanos y miniaturas."""
+    t0 = time.time()
+    stats = new_stats()
+    now = datetime.utcnow()
+
+    tasks = db.session.query(Task.id, Task.retention_days).filter(Task.retention_days > 0).all()
+    for task_id, days in tasks:
+        cutoff = now - timedelta(days=int(days))
+        delete_runs(
+            (Run.task_id == task_id, Run.started_at < cutoff, Run.status.notin_(_ACTIVE_STATUSES)),
+            stats,
+            batch_size,
+        )
+
+    remove_orphans(captures_dir, stats, orphan_grace)
+    thumbs.remove_stale(captures_dir, stats, orphan_grace)
+    stats["duration_ms"] = int((time.time() - t0) * 1000)
+    return stats
+
+
+def run_sweep(app):
+    """Job periodico: ejecuta sweep() y guarda sus estadisticas (leases.put_state)."""
+    with app.app_context():
+        try:
+            stats = sweep(
+                app.config["CAPTURES_DIR"],
+                batch_size=app.config["RETENTION_BATCH_SIZE"],
+            )
+        except Exception:
+            db.session.rollback()
+            log.exception("Fallo la limpieza de capturas antiguas")
+            return
+        if app.config["HTTP_CACHE_MAX_MB"] > 0:
+            stats["cache_bytes_reclaimed"] = disk_cache.enforce_limit(
+                app.config["HTTP_CACHE_DIR"], app.config["HTTP_CACHE_MAX_MB"] * 1024 * 1024
+            )
+        stats["finished_at"] = datetime.utcnow().isoformat()
+        # en la BD: /retention lo sirve la web, que no ejecuta la limpieza
+        leases.put_state("retention", stats)
+        log.info(
+            "Limpieza: %s runs, %s ficheros, %s huerfanos, %s bytes en %s ms",
+            stats["rows_deleted"],
+            stats["files_removed"],
+            stats["orphans_removed"],
+            stats["bytes_reclaimed"],
+            stats["duration_ms"],
+        )
@@ -0,0 +1,200 @@
+import logging
+import queue
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+
+from models import db, Run
+
+log = logging.getLogger(__name__)
+
+# La tabla runs es la cola de trabajo compartida por todos los workers:
+#
+#   QUEUED --claim_runs()--> RUNNING (lease_token + lease_expires_at) --> OK/UNCHANGED/ERROR
+#
+# El worker que reclama un run renueva su lease mientras lo ejecuta
+# (renew_leases). Si el worker muere, el lease caduca y reclaim_expired() lo
+# devuelve a la cola (o lo da por fallido tras max_attempts intentos). Un run
+# puede ejecutarse mas de una vez si un worker cae a mitad de envio.
+
+# Menor numero = mas prioridad
+PRIORITY_MANUAL = 0
+PRIORITY_SCHEDULED = 10
+
+
+def priority_for(trigger_name: str) -> int:
+    return PRIORITY_SCHEDULED if trigger_name == "SCHEDULED" else PRIORITY_MANUAL
+
+
+def enqueue_run(task, trigger_name: str):
+    """Inserta un Run QUEUED para task; el worker lo recoge de la BD.
+
+    Las ejecuciones programadas no se acumulan: si la tarea ya tiene un run en
+    cola o ejecutandose, devuelve None.
+    """
+    if trigger_name == "SCHEDULED":
+        busy = (
+            db.session.query(Run.id)
+            .filter(Run.task_id == task.id, Run.status.in_(["QUEUED", "RUNNING"]))
+            .first()
+        )
+        if busy is not None:
+            return None
+
+    run = Run(
+        task_id=task.id,
+        trigger=trigger_name,
+        started_at=datetime.utcnow(),
+        status="QUEUED",
+        priority=priority_for(trigger_name),
+    )
+    db.session.add(run)
+    db.session.commit()
+    return run
+
+
+def claim_runs(worker_id: str, limit: int, ttl: int) -> list:
+    """Reclama hasta limit runs en cola para worker_id. Devuelve [(run_id, token)].
+
+    Cada reclamacion es un UPDATE ... WHERE status = 'QUEUED': si dos workers
+    eligen el mismo run, solo a uno le afecta la fila.
+    """
+    if limit <= 0:
+        return []
+    now = datetime.utcnow()
+    candidates = (
+        db.session.query(Run.id)
+        .filter(Run.status == "QUEUED")
+        .order_by(Run.priority, Run.id)
+        .limit(limit * 4)
+        .with_for_update(skip_locked=True)  # PostgreSQL/MySQL; SQLite lo ignora
+        .all()
+    )
+    claimed = []
+    for (run_id,) in candidates:
+        if len(claimed) >= limit:
+            break
+        token = uuid.uuid4().hex
+        res = db.session.execute(
+            sa.update(Run)
+            .where(Run.id == run_id, Run.status == "QUEUED")
+            .values(
+                status="RUNNING",
+                lease_token=token,
+                lease_expires_at=now + timedelta(seconds=ttl),
+                heartbeat_at=now,
+                worker_id=worker_id,
+                attempts=sa.func.coalesce(Run.attempts, 0) + 1,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        if res.rowcount:
+            claimed.append((run_id, token))
+    db.session.commit()
+    return claimed
+
+
+def renew_leases(held: dict, ttl: int) -> set:
+    """Alarga el lease de los runs held ({run_id: token}). Devuelve los ids perdidos."""
+    now = datetime.utcnow()
+    lost = set()
+    for run_id, token in held.items():
+        res = db.session.execute(
+            sa.update(Run)
+            .where(Run.id == run_id, Run.lease_token == token, Run.status == "RUNNING")
+            .values(lease_expires_at=now + timedelta(seconds=ttl), heartbeat_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        if not res.rowcount:
+            lost.add(run_id)
+    db.session.commit()
+    return lost
+
+
+def release_leases(held: dict):
+    """Devuelve a la cola los runs held sin terminar (parada ordenada del worker)."""
+    for run_id, token in held.items():
+        db.session.execute(
+            sa.update(Run)
+            .where(Run.id == run_id, Run.lease_token == token, Run.status == "RUNNING")
+            .values(status="QUEUED", lease_token=None, lease_expires_at=None, worker_id=None)
+            .execution_options(synchronize_session=False)
+        )
+    db.session.commit()
+
+
+def reclaim_expired(max_attempts: int) -> tuple:
+    """Runs RUNNING con el lease caducado: a la cola otra vez o, agotados los intentos, ERROR."""
+    now = datetime.utcnow()
+    expired = sa.and_(
+        Run.status == "RUNNING",
+        sa.or_(Run.lease_expires_at < now, Run.lease_expires_at.is_(None)),
+    )
+    retried = db.session.execute(
+        sa.update(Run)
+        .where(expired, sa.func.coalesce(Run.attempts, 0) < max_attempts)
+        .values(status="QUEUED", lease_token=None, lease_expires_at=None, worker_id=None)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    failed = db.session.execute(
+        sa.update(Run)
+        .where(expired)
+        .values(
+            status="ERROR",
+            error_message="El worker que la ejecutaba dejo de responder",
+            finished_at=now,
+            lease_token=None,
+            lease_expires_at=None,
+        )
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return retried, failed
+
+
+class RunQueue:
+    """Cola en memoria de los runs ya reclamados por este proceso.
+
+    El worker pasa aqui el id de cada Run reclamado; los hilos llaman a
+    execute(run_id) de uno en uno, en el orden en que se reclamaron
+    (claim_runs ya da primero las ejecuciones manuales).
+    """
+
+    def __init__(self, execute, workers: int = 2):
+        self.execute = execute
+        self.workers = max(1, int(workers))
+
+        self._q = queue.Queue()
+        self._lock = threading.Lock()
+        self._running = 0
+        self._threads = []
+
+    def start(self):
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"run-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, run_id: int):
+        self._q.put(run_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            running = self._running
+        return {"workers": self.workers, "queued": self._q.qsize(), "running": running}
+
+    def _worker(self):
+        while True:
+            run_id = self._q.get()
+            with self._lock:
+                self._running += 1
+            try:
+                self.execute(run_id)
+            except Exception:
+                log.exception("Fallo inesperado ejecutando el run %s", run_id)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                self._q.task_done()
@@ -1,39 +1,215 @@
+import hashlib
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from apscheduler.jobstores.base import JobLookupError
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.interval import IntervalTrigger
 import pytz
 
-def build_scheduler(app, run_task_callable):
+# weekdays "1..7" -> cron: mon,tue...
+WEEKDAY_NAMES = {"1": "mon", "2": "tue", "3": "wed", "4": "thu", "5": "fri", "6": "sat", "7": "sun"}
+
+
+def job_id(task_id: int) -> str:
+    return f"task-{task_id}"
+
+
+def digest_job_id(group_id: int) -> str:
+    return f"digest-{group_id}"
+
+
+# Jitter: muchas tareas a las 08:00 arrancarian Chromium todas en el mismo
+# segundo. Cada tarea se desplaza un numero fijo de segundos dentro de su
+# ventana (Task.jitter_seconds, o SCHEDULE_JITTER_SECONDS si esta vacio),
+# calculado con un hash de su id de job: siempre cae en el mismo momento, en todos los
+# procesos, y las tareas quedan repartidas por la ventana.
+
+# origen comun de los IntervalTrigger con jitter (la fase la da el offset)
+INTERVAL_ANCHOR = datetime(2000, 1, 1)
+
+
+def jitter_window(t, default_jitter: int) -> int:
+    window = t.jitter_seconds if t.jitter_seconds is not None else default_jitter
+    return max(0, int(window or 0))
+
+
+def jitter_offset(key: str, window: int) -> int:
+    """Segundos (0..window) que se retrasa el job key; deterministico."""
+    if window <= 0:
+        return 0
+    h = hashlib.sha1(key.encode("utf-8")).hexdigest()
+    return int(h[:8], 16) % (window + 1)
+
+
+def schedule_signature(t, default_tz: str, default_jitter: int = 0):
+    # lo unico que afecta al trigger: si no cambia, el job se deja como esta
+    return (
+        t.schedule_type, t.time_hhmm, t.weekdays, t.interval_minutes, t.timezone or default_tz,
+        jitter_window(t, default_jitter),
+    )
+
+
+def build_trigger(t, default_tz: str, default_jitter: int = 0, key: str = None):
+    # t: Task o DigestGroup (mismos campos de programacion); key: id del job
+    key = key or job_id(t.id)
+    tz = pytz.timezone(t.timezone or default_tz)
+    window = jitter_window(t, default_jitter)
+    if t.schedule_type == "INTERVAL" and t.interval_minutes:
+        minutes = int(t.interval_minutes)
+        if not window:
+            return IntervalTrigger(minutes=minutes, timezone=tz)
+        # ventana limitada al propio intervalo; sin jitter se sigue contando desde el arranque
+        offset = jitter_offset(key, min(window, minutes * 60 - 1))
+        start = tz.localize(INTERVAL_ANCHOR) + timedelta(seconds=offset)
+        return IntervalTrigger(minutes=minutes, start_date=start, timezone=tz)
+
+    if t.schedule_type == "WEEKLY" and t.time_hhmm and t.weekdays:
+        days = ",".join(WEEKDAY_NAMES[x.strip()] for x in t.weekdays.split(",") if x.strip() in WEEKDAY_NAMES)
+    else:
+        # DAILY default
+        days = None
+    hh, mm = (t.time_hhmm or "08:00").split(":")
+    base = int(hh) * 3600 + int(mm) * 60
+    # sin pasar de medianoche: cambiaria el dia de la semana
+    offset = jitter_offset(key, min(window, 24 * 3600 - 1 - base))
+    hour, rest = divmod(base + offset, 3600)
+    minute, second = divmod(rest, 60)
+    if days:
+        return CronTrigger(day_of_week=days, hour=hour, minute=minute, second=second, timezone=tz)
+    return CronTrigger(hour=hour, minute=minute, second=second, timezone=tz)
+
+
+def is_anchored(t, default_jitter: int = 0) -> bool:
+    """False si la hora de las ejecuciones depende de cuando se creo el job.
+
+    Es el caso de INTERVAL sin jitter: build_trigger lo cuenta desde que el
+    worker programa el job, asi que otro proceso no puede saber en que minuto cae.
+    """
+    return not (t.schedule_type == "INTERVAL" and t.interval_minutes and not jitter_window(t, default_jitter))
+
+
+def due_per_minute(tasks, default_tz: str, default_jitter: int, start: datetime, end: datetime) -> tuple:
+    """Ejecuciones programadas de tasks entre start y end (aware), agrupadas por minuto UTC.
+
+    Devuelve ({minuto: [task_id, ...]}, [task_id, ...]); lo primero sirve para ver
+    de antemano los minutos punta, lo segundo son las tareas que no se pueden
+    colocar (is_anchored() falso). Las tareas de un grupo de resumen cuentan a la
+    hora del grupo.
+    """
+    due = defaultdict(list)
+    unanchored = []
+    for t in tasks:
+        item, key = t, job_id(t.id)
+        if t.digest_group_id is not None:
+            if not t.digest_group.enabled:
+                continue
+            item, key = t.digest_group, digest_job_id(t.digest_group_id)
+        if not is_anchored(item, default_jitter):
+            unanchored.append(t.id)
+            continue
+        trigger = build_trigger(item, default_tz, default_jitter, key=key)
+        prev = None
+        fire = trigger.get_next_fire_time(None, start)
+        while fire is not None and fire < end:
+            minute = fire.astimezone(pytz.utc).replace(second=0, microsecond=0, tzinfo=None)
+            due[minute].append(t.id)
+            prev = fire
+            fire = trigger.get_next_fire_time(prev, fire + timedelta(seconds=1))
+    return due, unanchored
+
+
+def build_scheduler(app, run_task_callable, run_digest_callable=None):
     sched = BackgroundScheduler(timezone=pytz.timezone(app.config["DEFAULT_TZ"]))
+    signatures = {}
+
+    def _upsert(jid: str, item, func, kwargs: dict):
+        jitter = app.config["SCHEDULE_JITTER_SECONDS"]
+        sig = schedule_signature(item, app.config["DEFAULT_TZ"], jitter)
+        job = sched.get_job(jid)
+        if job is not None and signatures.get(jid) == sig:
+            return
+
+        trigger = build_trigger(item, app.config["DEFAULT_TZ"], jitter, key=jid)
+        if job is not None:
+            job.reschedule(trigger=trigger)
+        else:
+            sched.add_job(
+                func,
+                trigger=trigger,
+                kwargs=kwargs,
+                id=jid,
+                replace_existing=True,
+                max_instances=1,
+                coalesce=True,
+            )
+        signatures[jid] = sig
+
+    def _remove(jid: str):
+        signatures.pop(jid, None)
+        try:
+            sched.remove_job(jid)
+        except JobLookupError:
+            pass
+
+    def upsert_job(t):
+        """Crea, reprograma o quita el job de una sola tarea."""
+        # las tareas de un grupo de resumen salen con el job del grupo
+        if not t.enabled or t.digest_group_id is not None:
+            remove_job(t.id)
+            return
+        _upsert(job_id(t.id), t, run_task_callable, {"task_id": t.id, "trigger_name": "SCHEDULED"})
+
+    def remove_job(task_id: int):
+        _remove(job_id(task_id))
+
+    def upsert_group(grp):
+        """Crea, reprograma o quita el job de un grupo de resumen."""
+        if not grp.enabled:
+            _remove(digest_job_id(grp.id))
+            return
+        _upsert(digest_job_id(grp.id), grp, run_digest_callable, {"group_id": grp.id})
+
+    def _prune(prefix: str, model, scheduled):
+        # Sobran jobs solo si hay mas que filas programables: entonces se
+        # buscan los ids que ya no existen (borrados o desactivados)
+        jids = [job.id for job in sched.get_jobs() if job.id.startswith(prefix)]
+        if len(jids) <= scheduled.count():
+            return
+        ids = [int(jid[len(prefix):]) for jid in jids]
+        keep = {f"{prefix}{i}" for (i,) in scheduled.filter(model.id.in_(ids)).with_entities(model.id)}
+        for jid in jids:
+            if jid not in keep:
+                _remove(jid)
+
+    def sync_changes(since):
+        """Aplica las tareas y grupos modificados desde since y quita los borrados."""
+        with app.app_context():
+            from models import Task, DigestGroup
+            for t in Task.query.filter(Task.updated_at > since).all():
+                upsert_job(t)
+            _prune("task-", Task, Task.query.filter_by(enabled=True, digest_group_id=None))
+            if run_digest_callable is not None:
+                for grp in DigestGroup.query.filter(DigestGroup.updated_at > since).all():
+                    upsert_group(grp)
+                _prune("digest-", DigestGroup, DigestGroup.query.filter_by(enabled=True))
 
     def reschedule_all():
+        """Resincroniza todos los jobs con la BD (arranque o resync manual)."""
         with app.app_context():
-            from models import Task
-            sched.remove_all_jobs()
-            tasks = Task.query.filter_by(enabled=True).all()
-            for t in tasks:
-                tz = pytz.timezone(t.timezone or app.config["DEFAULT_TZ"])
-                if t.schedule_type == "INTERVAL" and t.interval_minutes:
-                    trigger = IntervalTrigger(minutes=int(t.interval_minutes), timezone=tz)
-                elif t.schedule_type == "WEEKLY" and t.time_hhmm and t.weekdays:
-                    hh, mm = t.time_hhmm.split(":")
-                    # weekdays "1..7" -> cron: mon,tue...
-                    map_wd = { "1":"mon","2":"tue","3":"wed","4":"thu","5":"fri","6":"sat","7":"sun" }
-                    days = ",".join(map_wd.get(x.strip(), "") for x in t.weekdays.split(",") if x.strip() in map_wd)
-                    trigger = CronTrigger(day_of_week=days, hour=int(hh), minute=int(mm), timezone=tz)
-                else:
-                    # DAILY default
-                    hh, mm = (t.time_hhmm or "08:00").split(":")
-                    trigger = CronTrigger(hour=int(hh), minute=int(mm), timezone=tz)
-
-                sched.add_job(
-                    run_task_callable,
-                    trigger=trigger,
-                    kwargs={"task_id": t.id, "trigger_name": "SCHEDULED"},
-                    id=f"task-{t.id}",
-                    replace_existing=True,
-                    max_instances=1,
-                    coalesce=True,
-                )
-
-    return sched, reschedule_all
+            from models import Task, DigestGroup
+            wanted = set()
+            for t in Task.query.filter_by(enabled=True, digest_group_id=None).all():
+                upsert_job(t)
+                wanted.add(job_id(t.id))
+            if run_digest_callable is not None:
+                for grp in DigestGroup.query.filter_by(enabled=True).all():
+                    upsert_group(grp)
+                    wanted.add(digest_job_id(grp.id))
+            # solo los jobs de tareas y grupos: el resto (limpieza...) se mantiene
+            for job in sched.get_jobs():
+                if job.id.startswith(("task-", "digest-")) and job.id not in wanted:
+                    _remove(job.id)
+
+    return sched, reschedule_all, sync_changes
@@ -0,0 +1,152 @@
+import logging
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+
+from mailer import open_smtp_connection
+
+log = logging.getLogger(__name__)
+
+
+class _Bucket:
+    def __init__(self, size: int):
+        self.sem = threading.BoundedSemaphore(size)
+        self.idle = []  # [(conn, last_used)]
+        self.lock = threading.Lock()
+
+
+class SmtpPool:
+    """Sesiones SMTP autenticadas reutilizables, agrupadas por perfil.
+
+    Cada perfil tiene como mucho max_per_profile sesiones a la vez; las libres
+    se guardan hasta idle_timeout segundos. Antes de reutilizar una sesion que
+    lleva un rato parada se comprueba con NOOP, y si el servidor ha cortado la
+    conexion a mitad de envio se reintenta una vez con una sesion nueva.
+    """
+
+    def __init__(self, max_per_profile: int = 2, idle_timeout: int = 60, noop_after: int = 5,
+                 acquire_timeout: int = 120):
+        self.max_per_profile = max(1, int(max_per_profile))
+        self.idle_timeout = idle_timeout
+        self.noop_after = noop_after
+        self.acquire_timeout = acquire_timeout
+
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._reaper = threading.Thread(target=self._reap_loop, name="smtp-pool-reaper", daemon=True)
+        self._reaper.start()
+
+    def send(self, smtp_profile, password: str, from_addr: str, rcpts, msg_str: str):
+        for attempt in (1, 2):
+            try:
+                with self.connection(smtp_profile, password) as conn:
+                    conn.sendmail(from_addr, rcpts, msg_str)
+                return
+            except smtplib.SMTPServerDisconnected:
+                if attempt == 2:
+                    raise
+                log.info("Sesion SMTP cortada por el servidor (perfil %s), reconectando", smtp_profile.id)
+
+    @contextmanager
+    def connection(self, smtp_profile, password: str):
+        bucket = self._bucket(self._key(smtp_profile))
+        if not bucket.sem.acquire(timeout=self.acquire_timeout):
+            raise RuntimeError("Timeout esperando una sesion SMTP libre")
+        conn = None
+        try:
+            conn = self._take_idle(bucket) or open_smtp_connection(smtp_profile, password)
+            yield conn
+        except Exception:
+            # no sabemos en que estado queda la sesion: mejor cerrarla
+            self._close(conn)
+            conn = None
+            raise
+        finally:
+            if conn is not None:
+                with bucket.lock:
+                    bucket.idle.append((conn, time.time()))
+            bucket.sem.release()
+
+    def close_all(self):
+        with self._lock:
+            buckets = list(self._buckets.values())
+            self._buckets.clear()
+        for bucket in buckets:
+            with bucket.lock:
+                idle, bucket.idle = bucket.idle, []
+            for conn, _ in idle:
+                self._quit(conn)
+
+    # -------- internos --------
+
+    @staticmethod
+    def _key(smtp_profile):
+        # si se edita el perfil cambia la clave y no se reutilizan sesiones viejas
+        return (
+            smtp_profile.id,
+            smtp_profile.host,
+            int(smtp_profile.port),
+            (smtp_profile.encryption or "STARTTLS").upper(),
+            smtp_profile.username,
+            smtp_profile.password_env,
+        )
+
+    def _bucket(self, key) -> _Bucket:
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = _Bucket(self.max_per_profile)
+                self._buckets[key] = bucket
+            return bucket
+
+    def _take_idle(self, bucket: _Bucket):
+        while True:
+            with bucket.lock:
+                if not bucket.idle:
+                    return None
+                conn, last_used = bucket.idle.pop()
+            idle_for = time.time() - last_used
+            if idle_for > self.idle_timeout:
+                self._quit(conn)
+                continue
+            if idle_for > self.noop_after and not self._healthy(conn):
+                self._close(conn)
+                continue
+            return conn
+
+    @staticmethod
+    def _healthy(conn) -> bool:
+        try:
+            return conn.noop()[0] == 250
+        except Exception:
+            return False
+
+    def _reap_loop(self):
+        while True:
+            time.sleep(max(1, self.idle_timeout / 2))
+            now = time.time()
+            with self._lock:
+                buckets = list(self._buckets.values())
+            for bucket in buckets:
+                with bucket.lock:
+                    expired = [c for c, t in bucket.idle if now - t > self.idle_timeout]
+                    bucket.idle = [(c, t) for c, t in bucket.idle if now - t <= self.idle_timeout]
+                for conn in expired:
+                    self._quit(conn)
+
+    @staticmethod
+    def _quit(conn):
+        try:
+            conn.quit()
+        except Exception:
+            SmtpPool._close(conn)
+
+    @staticmethod
+    def _close(conn):
+        if conn is None:
+            return
+        try:
+            conn.close()
+        except Exception:
+            pass
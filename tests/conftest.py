@@ -0,0 +1,43 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def app(tmp_path):
+    from app import create_app
+
+    return create_app(
+        {
+            "APP_ROLE": "web",
+            "DATA_DIR": str(tmp_path),
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'app.db'}",
+            "CAPTURES_DIR": str(tmp_path / "captures"),
+            "HTTP_CACHE_DIR": str(tmp_path / "http-cache"),
+            "BROWSER_POOL_SIZE": 0,
+        }
+    )
+
+
+@pytest.fixture
+def worker(app):
+    from worker import Worker
+
+    w = Worker(app)
+    yield w
+    if w.sched.running:
+        w.sched.shutdown(wait=False)
+
+
+@pytest.fixture
+def smtp_profile(app):
+    from models import db, SmtpProfile
+
+    with app.app_context():
+        p = SmtpProfile(name="p", host="127.0.0.1", port=25, username="u", password_env="X", from_email="a@b")
+        db.session.add(p)
+        db.session.commit()
+        return p.id
@@ -0,0 +1,21 @@
+from models import db, Task
+
+
+def test_hotspots_leave_out_unanchored_intervals(app, smtp_profile):
+    with app.app_context():
+        daily = Task(name="d", url="http://x/", to_emails="a@b", smtp_profile_id=smtp_profile,
+                     schedule_type="DAILY", time_hhmm="08:00")
+        interval = Task(name="i", url="http://x/", to_emails="a@b", smtp_profile_id=smtp_profile,
+                        schedule_type="INTERVAL", interval_minutes=30)
+        jittered = Task(name="j", url="http://x/", to_emails="a@b", smtp_profile_id=smtp_profile,
+                        schedule_type="INTERVAL", interval_minutes=30, jitter_seconds=120)
+        db.session.add_all([daily, interval, jittered])
+        db.session.commit()
+        ids = (daily.id, interval.id, jittered.id)
+
+    body = app.test_client().get("/scheduler/hotspots?hours=24&top=500").get_json()
+
+    listed = {tid for m in body["minutes"] for tid in m["task_ids"]}
+    assert body["unanchored_task_ids"] == [ids[1]]
+    assert listed == {ids[0], ids[2]}
+    assert body["runs"] == 1 + 48
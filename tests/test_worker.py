@@ -0,0 +1,70 @@
+from models import db, Task, Run, DigestGroup, DigestBatch
+
+
+def test_enqueue_scheduled_returns_run_id(app, worker, smtp_profile):
+    with app.app_context():
+        t = Task(name="t", url="http://x/", to_emails="a@b", smtp_profile_id=smtp_profile)
+        db.session.add(t)
+        db.session.commit()
+        task_id = t.id
+
+    run_id = worker.enqueue_scheduled(task_id, "SCHEDULED")
+
+    assert run_id is not None
+    with app.app_context():
+        run = db.session.get(Run, run_id)
+        assert run.task_id == task_id
+        assert run.status == "QUEUED"
+
+
+def test_enqueue_digest_returns_batch_id(app, worker, smtp_profile):
+    with app.app_context():
+        grp = DigestGroup(name="g", smtp_profile_id=smtp_profile, schedule_type="INTERVAL", interval_minutes=60)
+        db.session.add(grp)
+        db.session.flush()
+        db.session.add(Task(name="t", url="http://x/", to_emails="a@b", smtp_profile_id=smtp_profile, digest_group_id=grp.id))
+        db.session.commit()
+        group_id = grp.id
+
+    batch_id = worker.enqueue_digest(group_id)
+
+    assert batch_id is not None
+    with app.app_context():
+        batch = db.session.get(DigestBatch, batch_id)
+        assert batch.group_id == group_id
+        assert Run.query.filter_by(digest_batch_id=batch_id, trigger="DIGEST").count() == 1
+
+
+def test_purge_cache_signal_reaches_non_leader(app, worker):
+    import leases
+
+    purged = []
+    worker.browser_pool = type("Pool", (), {"purge_cache": lambda self: purged.append(1)})()
+    assert not worker.is_leader
+    with app.app_context():
+        leases.touch_signal("purge-cache")
+        worker._handle_signals(("purge-cache",))
+    assert purged == [1]
+
+
+def test_stuck_sending_batch_is_retried(app, worker, smtp_profile):
+    from datetime import datetime, timedelta
+
+    sent = []
+    worker.finish_digest = lambda batch_id: sent.append(batch_id)
+    with app.app_context():
+        grp = DigestGroup(name="g", smtp_profile_id=smtp_profile, schedule_type="INTERVAL", interval_minutes=60)
+        db.session.add(grp)
+        db.session.flush()
+        old = datetime.utcnow() - timedelta(seconds=app.config["DIGEST_SEND_TIMEOUT_SECONDS"] + 60)
+        stuck = DigestBatch(group_id=grp.id, state="SENDING", sending_at=old)
+        live = DigestBatch(group_id=grp.id, state="SENDING", sending_at=datetime.utcnow())
+        db.session.add_all([stuck, live])
+        db.session.commit()
+        stuck_id, live_id = stuck.id, live.id
+
+        worker._send_ready_digests()
+        worker._digest_sender.shutdown(wait=True)
+
+        assert sent == [stuck_id]
+        assert db.session.get(DigestBatch, live_id).state == "SENDING"
@@ -0,0 +1,71 @@
+import os
+import threading
+import time
+
+from imaging import make_thumbnail
+
+# Miniaturas de las capturas, generadas la primera vez que se piden.
+#
+# Se guardan en CAPTURES_DIR/thumbs/<ancho>/<ruta de la captura>.jpg. Las
+# capturas no cambian nunca una vez escritas (las del almacen se llaman por su
+# hash), asi que una miniatura existente siempre es valida.
+
+THUMBS_SUBDIR = "thumbs"
+THUMB_WIDTHS = (160, 320, 640)
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def thumb_path(captures_dir: str, rel: str, width: int) -> str:
+    return os.path.join(captures_dir, THUMBS_SUBDIR, str(width), rel + ".jpg")
+
+
+def get_thumbnail(captures_dir: str, rel: str, width: int) -> str:
+    """Ruta de la miniatura de rel (relativa a captures_dir), creandola si falta."""
+    src = os.path.join(captures_dir, rel)
+    dst = thumb_path(captures_dir, rel, width)
+    if os.path.exists(dst):
+        return dst
+
+    # una sola generacion por miniatura aunque lleguen varias peticiones a la vez
+    with _locks_guard:
+        lock = _locks.setdefault(dst, threading.Lock())
+    with lock:
+        try:
+            if not os.path.exists(dst):
+                data = make_thumbnail(src, width)
+                os.makedirs(os.path.dirname(dst), exist_ok=True)
+                tmp = f"{dst}.{os.getpid()}.tmp"
+                with open(tmp, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, dst)
+        finally:
+            with _locks_guard:
+                _locks.pop(dst, None)
+    return dst
+
+
+def remove_stale(captures_dir: str, stats: dict, grace_seconds: int = 3600):
+    """Borra las miniaturas cuya captura original ya no existe."""
+    limit = time.time() - grace_seconds
+    root = os.path.join(captures_dir, THUMBS_SUBDIR)
+    if not os.path.isdir(root):
+        return
+    for width in os.listdir(root):
+        base = os.path.join(root, width)
+        for dirpath, _dirs, files in os.walk(base):
+            for name in files:
+                path = os.path.join(dirpath, name)
+                rel = os.path.relpath(path, base)
+                if name.endswith(".jpg") and os.path.exists(os.path.join(captures_dir, rel[:-4])):
+                    continue
+                try:
+                    if os.path.getmtime(path) > limit:
+                        continue  # puede estar escribiendose (.tmp)
+                    size = os.path.getsize(path)
+                    os.remove(path)
+                except OSError:
+                    continue
+                stats["thumbs_removed"] += 1
+                stats["bytes_reclaimed"] += size
@@ -23,8 +23,15 @@ TRANSLATIONS = {
         "Tarea eliminada": "Task deleted",
         "Tarea activada": "Task enabled",
         "Tarea pausada": "Task paused",
+        "Programacion resincronizada": "Schedule resynchronized",
+        "Resincronizar programacion": "Resync schedule",
         "Captura hecha (sin enviar correo). Mira el historial.": "Capture taken (no email sent). Check the history.",
         "Test completo ejecutado. Mira el historial.": "Full test executed. Check the history.",
+        "Captura en cola (sin enviar correo). Mira el historial.": "Capture queued (no email will be sent). Check the history.",
+        "Test completo en cola. Mira el historial.": "Full test queued. Check the history.",
+        "La tarea esta pausada o no existe": "The task is paused or does not exist",
+        "En cola": "Queued",
+        "En ejecucion": "Running",
         "Perfil SMTP creado": "SMTP profile created",
         "Perfil SMTP actualizado": "SMTP profile updated",
         "SMTP OK (correo enviado)": "SMTP OK (email sent)",
@@ -65,13 +72,17 @@ TRANSLATIONS = {
         "Direccion a la que se respondera el correo si el destinatario pulsa “Responder”.": "Address used when the recipient hits \"Reply\".",
         "Consejo: usa siempre contrasenas de aplicacion y variables de entorno para mayor seguridad.": "Tip: always use app passwords and environment variables for better security.",
         "Todas": "All",
-        "OK y ERROR": "OK and ERROR",
+        "Todos los estados": "All statuses",
         "Solo OK": "Only OK",
         "Solo ERROR": "Only ERROR",
         "Desde": "From",
         "Hasta": "To",
         "Filtrar": "Filter",
-        "Mostrando {shown} de {total} ejecuciones (max 200 mas recientes).": "Showing {shown} of {total} runs (max last 200).",
+        "Mostrando {shown} ejecuciones.": "Showing {shown} runs.",
+        "Total: {total}.": "Total: {total}.",
+        "Contar total": "Count total",
+        "Mas recientes": "Newer",
+        "Mas antiguas": "Older",
         "Filtro de estado: {status}.": "Status filter: {status}.",
         "Rango: <strong>{start}</strong> a <strong>{end}</strong>.": "Range: <strong>{start}</strong> to <strong>{end}</strong>.",
         "inicio": "start",
@@ -89,10 +100,35 @@ TRANSLATIONS = {
         "Weekdays (1..7)": "Weekdays (1..7)",
         "Lun=1 ... Dom=7": "Mon=1 ... Sun=7",
         "Interval (min)": "Interval (min)",
+        "Desfase maximo (s)": "Max jitter (s)",
+        "Grupo de resumen": "Digest group",
+        "Ninguno (correo propio)": "None (own email)",
+        "En un grupo la tarea sale con la programacion del grupo y va en su correo.": "In a group the task follows the group's schedule and goes in its email.",
+        "Resumenes": "Digests",
+        "Grupos de resumen": "Digest groups",
+        "Nuevo grupo": "New group",
+        "Editar grupo": "Edit group",
+        "Las tareas de un grupo se capturan juntas con la programacion del grupo y se envian en un solo correo a todos sus destinatarios.": "Tasks in a group are captured together on the group's schedule and sent in a single email to all their recipients.",
+        "Enviar ahora": "Send now",
+        "¿Seguro que quieres eliminar el grupo?": "Are you sure you want to delete the group?",
+        "Variables: {group_name}, {date}, {time}, {count}": "Variables: {group_name}, {date}, {time}, {count}",
+        "El correo va a la union de los destinatarios de las tareas. Cada tarea conserva sus ajustes de captura y \"Enviar solo si cambia\".": "The email goes to the union of the tasks' recipients. Each task keeps its capture settings and \"Send only on change\".",
+        "Grupo creado": "Group created",
+        "Grupo actualizado": "Group updated",
+        "Grupo eliminado": "Group deleted",
+        "El grupo no tiene tareas activas o ya se esta enviando": "The group has no active tasks or is already being sent",
+        "Resumen en cola. Mira el historial.": "Digest queued. Check the history.",
+        "Retraso fijo de 0 a N segundos para no coincidir con otras tareas. Vacio = valor global.": "Fixed 0 to N second delay so tasks do not start together. Empty = global setting.",
         "Viewport width": "Viewport width",
         "Viewport height": "Viewport height",
         "CSS zoom": "CSS zoom",
-        "Full page (v1: viewport grande)": "Full page (v1: large viewport)",
+        "Pagina completa": "Full page",
+        "Formato de imagen": "Image format",
+        "WebP no se ve en algunos clientes de correo (Outlook).": "WebP is not shown by some email clients (Outlook).",
+        "Calidad JPEG/WebP (1-100)": "JPEG/WebP quality (1-100)",
+        "Ancho maximo (px)": "Max width (px)",
+        "Vacio = sin reescalar.": "Empty = no downscaling.",
+        "Device scale factor": "Device scale factor",
         "Wait mode": "Wait mode",
         "Wait seconds": "Wait seconds",
         "Wait selector (si SELECTOR)": "Wait selector (if SELECTOR)",
@@ -109,6 +145,17 @@ TRANSLATIONS = {
         "Detectamos el primer id o clase del elemento para crear un selector CSS automaticamente.": "We detect the first id or class to build a CSS selector automatically.",
         "Detectar y añadir": "Detect and add",
         "pre_js (opcional)": "pre_js (optional)",
+        "Bloquear recursos": "Block resources",
+        "Fuentes": "Fonts",
+        "Video/audio": "Video/audio",
+        "Imagenes": "Images",
+        "Usar lista global (analitica, publicidad, chats)": "Use global list (analytics, ads, chats)",
+        "Bloquear URLs / dominios": "Block URLs / domains",
+        "Uno por linea. Admite * como comodin; un dominio suelto bloquea todo lo que venga de el.": "One per line. * is a wildcard; a bare domain blocks everything served from it.",
+        "Bloqueados": "Blocked",
+        "Reutilizar cache HTTP entre capturas": "Reuse HTTP cache between captures",
+        "Vaciar cache HTTP": "Purge HTTP cache",
+        "Cache HTTP vaciada ({mb} MB liberados)": "HTTP cache purged ({mb} MB freed)",
         "Como funciona la espera antes de la captura": "How the wait before the capture works",
         "SLEEP": "SLEEP",
         "SELECTOR": "SELECTOR",
@@ -116,6 +163,10 @@ TRANSLATIONS = {
         "SELECTOR: espera a que aparezca un elemento concreto (CSS).": "SELECTOR: wait until a specific element (CSS) appears.",
         "En SLEEP: segundos antes de capturar.": "In SLEEP: seconds before capturing.",
         "En SELECTOR: tiempo maximo de espera.": "In SELECTOR: maximum wait time.",
+        "NETWORK_IDLE: captura cuando no quedan peticiones de red en curso.": "NETWORK_IDLE: capture once no network requests are in flight.",
+        "DOM_STABLE: captura cuando la pagina deja de cambiar.": "DOM_STABLE: capture once the page stops changing.",
+        "En NETWORK_IDLE y DOM_STABLE: tiempo maximo de espera. El historial muestra cuanto se espero realmente.": "In NETWORK_IDLE and DOM_STABLE: maximum wait time. The history shows the actual wait.",
+        "Espera": "Wait",
         "Wait selector: selector CSS que indica que la pagina esta lista.": "Wait selector: CSS selector that indicates the page is ready.",
         "Solo se usa si Wait mode = SELECTOR.": "Only used when Wait mode = SELECTOR.",
         "Ejemplos:": "Examples:",
@@ -136,6 +187,12 @@ TRANSLATIONS = {
         "Inserta la imagen en el cuerpo del correo.": "Embed the image in the email body.",
         "Adjuntar tambien": "Also attach",
         "Adjunta la imagen como archivo.": "Attach the image as a file.",
+        "Sin cambios": "Unchanged",
+        "Cambio": "Change",
+        "Enviar solo si cambia": "Send only on change",
+        "Las ejecuciones programadas no envian correo si la captura es igual a la ultima enviada.": "Scheduled runs send no email when the capture matches the last one sent.",
+        "Umbral de cambio (%)": "Change threshold (%)",
+        "Porcentaje de la imagen que puede cambiar sin considerarse distinta. 0 = cualquier cambio visible.": "Share of the image that may change and still count as unchanged. 0 = any visible change.",
         "¿Seguro que quieres eliminar la tarea?": "Are you sure you want to delete the task?",
         "¿Seguro que quieres eliminar el perfil SMTP?": "Are you sure you want to delete the SMTP profile?",
         "Email": "Email",
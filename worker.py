@@ -0,0 +1,645 @@
+import atexit
+import json
+import logging
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import sqlalchemy as sa
+
+from models import db, Task, Run, SmtpProfile, DigestGroup, DigestBatch
+from scheduler import build_scheduler
+from capture import capture_screenshot, build_driver
+from browser_pool import BrowserPool
+from admission import AdmissionController, estimate_mb, MB
+from run_queue import (
+    RunQueue,
+    enqueue_run,
+    claim_runs,
+    renew_leases,
+    release_leases,
+    reclaim_expired,
+)
+from mailer import send_email_with_screenshot, send_digest_email
+from smtp_pool import SmtpPool
+from metrics import Metrics, timed
+from imaging import image_signature, signature_diff
+from coalesce import CaptureCoalescer, capture_key
+import blobstore
+import digest
+import disk_cache
+import leases
+import retention
+
+log = logging.getLogger(__name__)
+
+# Ejecucion de runs y scheduler, separados de la web.
+#
+# `python -m worker` arranca un proceso dedicado; con APP_ROLE=all (por
+# defecto) create_app() arranca uno dentro del propio proceso web. La web y el
+# scheduler solo insertan runs QUEUED; cualquier numero de workers, en una o
+# varias maquinas, los reclaman de la BD con un lease (run_queue.claim_runs).
+# Solo el worker que tiene el lease "scheduler" programa las tareas.
+
+SCHEDULER_LEASE = "scheduler"
+# Señales de la web: "schedule" (tareas o grupos guardados, se aplican solo los
+# cambios) y "resync" (reprogramarlo todo) las atiende el worker con el lease;
+# "purge-cache" todos, porque cada worker tiene su propio pool de navegadores
+LEADER_SIGNALS = ("schedule", "resync")
+
+
+class LeaseLost(Exception):
+    """Otro worker ha reclamado el run que se estaba ejecutando."""
+
+
+class Worker:
+    def __init__(self, app):
+        self.app = app
+        cfg = app.config
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.is_leader = False
+
+        self.cache_root = cfg["HTTP_CACHE_DIR"] if cfg["HTTP_CACHE_MAX_MB"] > 0 else None
+
+        self.browser_pool = None
+        if cfg["BROWSER_POOL_SIZE"] > 0:
+            self.browser_pool = BrowserPool(
+                self._pool_driver,
+                size=cfg["BROWSER_POOL_SIZE"],
+                max_uses=cfg["BROWSER_MAX_USES"],
+                max_rss_mb=cfg["BROWSER_MAX_RSS_MB"],
+            )
+
+        self.admission = None
+        if cfg["ADMISSION_ENABLED"]:
+            self.admission = AdmissionController(reserve_mb=cfg["ADMISSION_RESERVE_MB"])
+
+        self.smtp_pool = None
+        if cfg["SMTP_POOL_SIZE"] > 0:
+            self.smtp_pool = SmtpPool(
+                max_per_profile=cfg["SMTP_POOL_SIZE"],
+                idle_timeout=cfg["SMTP_IDLE_TIMEOUT"],
+            )
+
+        self.metrics = Metrics()
+        self.metrics.describe("webshot_phase_seconds", "Duracion de cada fase de un run")
+        self.metrics.describe("webshot_runs_total", "Runs terminados por estado y disparador")
+        self.metrics.describe("webshot_smtp_failures_total", "Envios fallidos por id de perfil SMTP (el nombre se puede cambiar)")
+        self.metrics.describe("webshot_digests_total", "Lotes de resumen terminados por estado")
+
+        self.coalescer = CaptureCoalescer(ttl=cfg["COALESCE_TTL_SECONDS"], enabled=cfg["COALESCE_ENABLED"])
+        self.run_queue = RunQueue(self._execute, workers=cfg["RUN_WORKERS"])
+
+        self.sched, self.reschedule_all, self.sync_changes = build_scheduler(
+            app, self.enqueue_scheduled, self.enqueue_digest
+        )
+        self.sched.add_job(
+            retention.run_sweep,
+            trigger="interval",
+            minutes=cfg["RETENTION_INTERVAL_MINUTES"],
+            args=[app],
+            id="retention-sweep",
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+        )
+
+        self._held = {}  # run_id -> token de los runs reclamados por este proceso
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._signals = {}
+        self._last_sync = 0.0
+        self._sync_from = None  # updated_at desde el que buscar cambios de tareas
+        # envio de los lotes de resumen que no cerro ningun run (SMTP puede tardar)
+        self._digest_sender = ThreadPoolExecutor(max_workers=1, thread_name_prefix="digest-sender")
+        self._digests_sending = set()
+
+    # -------- ciclo de vida --------
+
+    def start(self):
+        with self.app.app_context():
+            # vaciados de cache anteriores al arranque ya no afectan a este pool
+            self._signals["purge-cache"] = leases.signal_stamp("purge-cache")
+        self.sched.start(paused=True)
+        self.run_queue.start()
+        if self.browser_pool is not None:
+            self.browser_pool.warm()
+        threading.Thread(target=self._loop, name="worker-loop", daemon=True).start()
+        atexit.register(self.stop)
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        with self._lock:
+            held = dict(self._held)
+        with self.app.app_context():
+            if held:
+                release_leases(held)
+            if self.is_leader:
+                leases.release(SCHEDULER_LEASE, self.holder)
+        if self.browser_pool is not None:
+            self.browser_pool.close()
+        self._digest_sender.shutdown(wait=False)
+        if self.smtp_pool is not None:
+            self.smtp_pool.close_all()
+
+    def wake(self):
+        """Revisar la cola ya (un run acaba de encolarse en este mismo proceso)."""
+        self._wake.set()
+
+    def stats(self) -> dict:
+        return {
+            "holder": self.holder,
+            "leader": self.is_leader,
+            "queue": self.run_queue.stats(),
+            "held": len(self._held),
+            "browsers": self.browser_pool.stats() if self.browser_pool is not None else None,
+        }
+
+    def metric_gauges(self) -> list:
+        q = self.run_queue.stats()
+        gauges = [
+            ("webshot_worker_leader", "1 si este worker tiene el lease del scheduler", int(self.is_leader), {}),
+            ("webshot_runs_running", "Runs ejecutandose", q["running"], {}),
+            ("webshot_run_workers", "Workers de la cola", q["workers"], {}),
+        ]
+        if self.browser_pool is not None:
+            b = self.browser_pool.stats()
+            gauges += [
+                ("webshot_browsers_active", "Navegadores del pool en uso", b["busy"], {}),
+                ("webshot_browsers_idle", "Navegadores del pool libres", b["idle"], {}),
+                ("webshot_browser_pool_size", "Tamaño maximo del pool de navegadores", b["size"], {}),
+            ]
+        if self.admission is not None:
+            a = self.admission.stats()
+            gauges += [
+                ("webshot_captures_admitted", "Capturas en curso admitidas por memoria", a["active"], {}),
+                ("webshot_captures_waiting", "Capturas esperando memoria libre", a["waiting"], {}),
+                ("webshot_capture_memory_pending_bytes", "Memoria que aun pediran las capturas en curso", a["pending_bytes"], {}),
+            ]
+            if a["available_bytes"] is not None:
+                gauges.append(("webshot_memory_available_bytes", "Memoria disponible (host o cgroup)", a["available_bytes"], {}))
+        return gauges
+
+    # -------- bucle principal --------
+
+    def _loop(self):
+        cfg = self.app.config
+        lease_ttl = cfg["SCHEDULER_LEASE_SECONDS"]
+        run_ttl = cfg["RUN_LEASE_SECONDS"]
+        next_renew = 0.0
+        next_heartbeat = 0.0
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    if time.time() >= next_renew:
+                        self._renew(lease_ttl)
+                        next_renew = time.time() + lease_ttl / 3.0
+                    self._handle_signals(("purge-cache",))
+                    if self.is_leader:
+                        self._handle_signals(LEADER_SIGNALS)
+                        if time.time() - self._last_sync >= cfg["SCHEDULER_SYNC_SECONDS"]:
+                            # cambios de tareas hechos desde la web (otro proceso)
+                            self._sync_schedule()
+                            # lotes cuyo ultimo run no lo termino un worker (caido)
+                            self._send_ready_digests()
+                    if time.time() >= next_heartbeat:
+                        self._heartbeat(run_ttl)
+                        next_heartbeat = time.time() + run_ttl / 3.0
+                    self._claim(run_ttl)
+            except Exception:
+                db.session.rollback()
+                log.exception("Fallo en el bucle del worker")
+            self._wake.wait(cfg["WORKER_POLL_SECONDS"])
+            self._wake.clear()
+
+    def _renew(self, ttl: int):
+        leader = leases.acquire(SCHEDULER_LEASE, self.holder, ttl)
+        if leader and not self.is_leader:
+            log.info("Worker %s toma el scheduler", self.holder)
+            self._take_over()
+        elif not leader and self.is_leader:
+            log.warning("Worker %s pierde el lease del scheduler", self.holder)
+            self.sched.pause()
+        self.is_leader = leader
+
+    def _take_over(self):
+        self._signals.update({name: leases.signal_stamp(name) for name in LEADER_SIGNALS})
+        self._sync_from = datetime.utcnow()
+        self.reschedule_all()
+        self._last_sync = time.time()
+        self.sched.resume()
+
+    def _handle_signals(self, names):
+        for name in names:
+            stamp = leases.signal_stamp(name)
+            if stamp is None or stamp == self._signals.get(name):
+                continue
+            self._signals[name] = stamp
+            if name == "schedule":
+                self._sync_schedule()
+            elif name == "resync":
+                self.reschedule_all()
+                self._last_sync = time.time()
+            elif self.browser_pool is not None:
+                self.browser_pool.purge_cache()
+
+    def _sync_schedule(self):
+        # Solo lo modificado desde la vuelta anterior. La ventana se solapa un
+        # periodo con la anterior (commits lentos, relojes algo desfasados con
+        # la web); volver a ver una tarea sin cambios no reprograma nada
+        now = datetime.utcnow()
+        self.sync_changes(self._sync_from or now)
+        self._sync_from = now - timedelta(seconds=self.app.config["SCHEDULER_SYNC_SECONDS"])
+        self._last_sync = time.time()
+
+    def _send_ready_digests(self):
+        # el envio va a otro hilo: este bucle es el que renueva los leases
+        timeout = self.app.config["DIGEST_SEND_TIMEOUT_SECONDS"]
+        for batch_id in digest.reclaim_stuck(timeout):
+            log.warning("Lote de resumen %s: mas de %s s en SENDING (worker caido), se reintenta", batch_id, timeout)
+        for batch_id in digest.ready_batches():
+            with self._lock:
+                if batch_id in self._digests_sending:
+                    continue
+                self._digests_sending.add(batch_id)
+            self._digest_sender.submit(self._send_digest, batch_id)
+
+    def _send_digest(self, batch_id: int):
+        try:
+            with self.app.app_context():
+                try:
+                    self.finish_digest(batch_id)
+                except Exception:
+                    db.session.rollback()
+                    log.exception("Fallo al cerrar el lote de resumen %s", batch_id)
+        finally:
+            with self._lock:
+                self._digests_sending.discard(batch_id)
+
+    def _heartbeat(self, ttl: int):
+        with self._lock:
+            held = dict(self._held)
+        if held:
+            for run_id in renew_leases(held, ttl):
+                log.warning("Run %s: lease perdido, otro worker lo ejecutara", run_id)
+        retried, failed = reclaim_expired(self.app.config["RUN_MAX_ATTEMPTS"])
+        if retried or failed:
+            log.warning("Leases caducados: %s runs devueltos a la cola, %s fallidos", retried, failed)
+
+    def _claim(self, ttl: int):
+        with self._lock:
+            free = self.run_queue.workers - len(self._held)
+        for run_id, token in claim_runs(self.holder, free, ttl):
+            with self._lock:
+                self._held[run_id] = token
+            self.run_queue.submit(run_id)
+
+    def _execute(self, run_id: int):
+        try:
+            with self._lock:
+                token = self._held.get(run_id)
+            if token:
+                self.run_task(run_id, token)
+        finally:
+            with self._lock:
+                self._held.pop(run_id, None)
+            self._wake.set()  # hay un hueco libre: reclamar otro
+
+    # -------- runs --------
+
+    def enqueue_scheduled(self, task_id: int, trigger_name: str):
+        with self.app.app_context():
+            task = Task.query.get(task_id)
+            if not task or not task.enabled:
+                return None
+            run = enqueue_run(task, trigger_name)
+            # el id se lee aqui: fuera del contexto la instancia ya no tiene sesion
+            run_id = run.id if run else None
+        self.wake()
+        return run_id
+
+    def enqueue_digest(self, group_id: int):
+        with self.app.app_context():
+            group = DigestGroup.query.get(group_id)
+            if not group or not group.enabled:
+                return None
+            batch = digest.enqueue_digest(group)
+            batch_id = batch.id if batch else None
+        self.wake()
+        return batch_id
+
+    def finish_digest(self, batch_id: int):
+        # lo envia solo quien reclama el lote, una vez terminados todos sus runs
+        if not digest.claim(batch_id):
+            return
+        batch = DigestBatch.query.get(batch_id)
+        group = batch.group
+        runs = [r for r in digest.batch_runs(batch_id) if r.status == "OK" and r.screenshot_path]
+        runs = [r for r in runs if os.path.exists(r.screenshot_path)]
+        if not runs or group is None:
+            # nada nuevo que contar: todas sin cambios o con error
+            batch.state = "SKIPPED"
+        else:
+            items = [(r.task, r.screenshot_path, self.capture_filename(r.task, r.screenshot_path)) for r in runs]
+            try:
+                send_digest_email(group, group.smtp_profile, items, pool=self.smtp_pool)
+                batch.state = "SENT"
+                batch.images = len(items)
+            except Exception as e:
+                self.metrics.inc("webshot_smtp_failures_total", profile_id=group.smtp_profile_id)
+                batch.state = "ERROR"
+                batch.error_message = str(e)
+                for r in runs:
+                    r.status = "ERROR"
+                    r.error_message = f"Resumen no enviado: {e}"
+        batch.sent_at = datetime.utcnow()
+        db.session.commit()
+        self.metrics.inc("webshot_digests_total", state=batch.state)
+
+    def _pool_driver(self, slot_no: int):
+        cfg = self.app.config
+        return build_driver(
+            cfg["CHROME_BIN"],
+            cfg["CHROMEDRIVER_BIN"],
+            cache_dir=disk_cache.slot_dir(self.cache_root, slot_no) if self.cache_root else None,
+            cache_size_mb=cfg["HTTP_CACHE_DIR_MB"],
+        )
+
+    def take_capture(self, task: Task, key: str, phases: dict, fresh: bool = False):
+        # Tareas con la misma clave de captura comparten un unico render: el
+        # fichero va al almacen por contenido y cada run suma una referencia
+        cfg = self.app.config
+
+        def _capture():
+            stats = {}
+            with self._admitted(task, phases) as ticket:
+                path = capture_screenshot(
+                    task,
+                    chrome_bin=cfg["CHROME_BIN"],
+                    chromedriver_bin=cfg["CHROMEDRIVER_BIN"],
+                    captures_dir=cfg["CAPTURES_DIR"],
+                    pool=self.browser_pool,
+                    stats=stats,
+                    blocklist=cfg["BLOCKLIST"],
+                    cache_dir=disk_cache.task_dir(self.cache_root, task.id) if self.cache_root and task.use_disk_cache else None,
+                    cache_size_mb=cfg["HTTP_CACHE_DIR_MB"],
+                    phases=phases,
+                    ticket=ticket,
+                )
+            if ticket is not None and ticket.pid:
+                stats["peak_rss_mb"] = ticket.growth // MB
+            with timed(phases, "store"):
+                digest, path = blobstore.put(cfg["CAPTURES_DIR"], path)
+            return digest, path, stats
+
+        (digest, path, stats), shared = self.coalescer.run(
+            key, _capture, is_valid=lambda res: os.path.exists(res[1]), fresh=fresh
+        )
+        if shared:
+            path = blobstore.add_ref(digest)
+            stats = dict(stats, coalesced=True)
+        return digest, path, stats
+
+    @contextmanager
+    def _admitted(self, task: Task, phases: dict):
+        # espera hasta que la memoria estimada de la captura quepa
+        if self.admission is None:
+            yield None
+            return
+        cfg = self.app.config
+        estimate = estimate_mb(
+            task,
+            history=cfg["ADMISSION_HISTORY"],
+            margin=cfg["ADMISSION_MARGIN"],
+            default_mb=cfg["ADMISSION_DEFAULT_MB"],
+        )
+        t0 = time.perf_counter()
+        with self.admission.admit(estimate) as ticket:
+            phases["admission"] = int((time.perf_counter() - t0) * 1000)
+            yield ticket
+
+    @staticmethod
+    def capture_filename(task: Task, path: str) -> str:
+        # nombre legible para el adjunto; en disco el fichero se llama por su hash
+        stamp = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+        return f"task{task.id}_{stamp}{os.path.splitext(path)[1]}"
+
+    @staticmethod
+    def is_unchanged(task: Task, run: Run) -> bool:
+        # Compara con la ultima captura enviada: hash exacto y, si difiere,
+        # firma reducida 64x64 (fraccion de celdas cambiadas en run.diff_score)
+        with open(run.screenshot_path, "rb") as f:
+            data = f.read()
+        run.image_signature = image_signature(data)
+        if run.trigger not in ("SCHEDULED", "DIGEST"):
+            return False
+
+        prev = (
+            Run.query.filter(
+                Run.task_id == task.id,
+                Run.id != run.id,
+                Run.status == "OK",
+                Run.trigger.in_(["SCHEDULED", "MANUAL_TEST", "DIGEST"]),
+                Run.image_signature.isnot(None),
+            )
+            .order_by(Run.id.desc())
+            .first()
+        )
+        if prev is None:
+            return False
+        if prev.content_hash == run.content_hash:
+            run.diff_score = 0.0
+        else:
+            run.diff_score = signature_diff(prev.image_signature, run.image_signature)
+        return run.diff_score * 100 <= (task.change_threshold or 0)
+
+    @staticmethod
+    def _owns(run_id: int, token: str) -> bool:
+        return db.session.query(Run.lease_token).filter(Run.id == run_id).scalar() == token
+
+    @staticmethod
+    def _drop_capture(run_id: int, captured, attempts=None) -> bool:
+        """Quita la captura del run y suelta su referencia si el run aun la apunta.
+
+        Tanto el worker que pierde el lease como el que reintenta el run pasan
+        por aqui; solo el lado cuyo UPDATE condicional cambia la fila libera la
+        referencia. Con attempts, no toca la fila si otro worker ya ha
+        reclamado el run (claim_runs suma un intento).
+        """
+        cond = [Run.id == run_id, Run.content_hash == captured.content_hash]
+        if attempts is not None:
+            cond.append(sa.func.coalesce(Run.attempts, 0) == attempts)
+        res = db.session.execute(
+            sa.update(Run)
+            .where(*cond)
+            .values(content_hash=None, screenshot_path=None)
+            .execution_options(synchronize_session=False)
+        )
+        if res.rowcount:
+            blobstore.release([captured], retention.new_stats())
+        db.session.commit()
+        return bool(res.rowcount)
+
+    def run_task(self, run_id: int, token: str):
+        metrics = self.metrics
+        with self.app.app_context():
+            run = Run.query.get(run_id)
+            if not run or run.lease_token != token:
+                return
+            task = run.task
+            attempts = run.attempts or 0
+
+            if run.content_hash:
+                # captura de un intento anterior (worker caido): soltar su referencia
+                self._drop_capture(run.id, SimpleNamespace(content_hash=run.content_hash, screenshot_path=run.screenshot_path))
+
+            # started_at es el momento de encolar hasta que el run arranca
+            now = datetime.utcnow()
+            phases = {"queue": max(0, int((now - run.started_at).total_seconds() * 1000)) if run.started_at else 0}
+            run.started_at = now
+            db.session.commit()
+
+            t0 = time.time()
+            captured = None
+            stored = False
+            try:
+                smtp = SmtpProfile.query.get(task.smtp_profile_id)
+                if not smtp:
+                    raise RuntimeError("No hay perfil SMTP asociado")
+
+                key = capture_key(task)
+                with timed(phases, "capture"):
+                    # quien lanza una ejecucion a mano espera ver la pagina de ahora
+                    content_hash, screenshot_path, capture_stats = self.take_capture(
+                        task, key, phases, fresh=run.trigger.startswith("MANUAL_")
+                    )
+                captured = SimpleNamespace(content_hash=content_hash, screenshot_path=screenshot_path)
+                # la referencia pasa al run solo si este worker sigue teniendo el lease
+                stored = bool(db.session.execute(
+                    sa.update(Run)
+                    .where(Run.id == run.id, Run.lease_token == token)
+                    .values(capture_key=key, content_hash=content_hash, screenshot_path=screenshot_path)
+                    .execution_options(synchronize_session=False)
+                ).rowcount)
+                db.session.commit()
+                if not stored:
+                    raise LeaseLost()
+                run.wait_ms = capture_stats.get("wait_ms")
+                run.blocked_requests = capture_stats.get("blocked_requests")
+                run.bytes_saved = capture_stats.get("bytes_saved")
+                if not capture_stats.get("coalesced"):
+                    run.peak_rss_mb = capture_stats.get("peak_rss_mb")
+                run.stats_json = json.dumps(capture_stats)
+                run.image_bytes = os.path.getsize(screenshot_path) if os.path.exists(screenshot_path) else None
+
+                with timed(phases, "change"):
+                    unchanged = task.send_only_on_change and self.is_unchanged(task, run)
+                # los runs DIGEST los envia finish_digest en un solo correo
+                if run.trigger not in ("MANUAL_CAPTURE", "DIGEST") and not unchanged:
+                    try:
+                        send_email_with_screenshot(
+                            task, smtp, screenshot_path, pool=self.smtp_pool,
+                            filename=self.capture_filename(task, screenshot_path), phases=phases,
+                        )
+                    except Exception:
+                        metrics.inc("webshot_smtp_failures_total", profile_id=smtp.id)
+                        raise
+
+                run.status = "UNCHANGED" if unchanged else "OK"
+                run.error_message = None
+            except LeaseLost:
+                pass
+            except Exception as e:
+                run.status = "ERROR"
+                run.error_message = str(e)
+            finally:
+                if not self._owns(run.id, token):
+                    # otro worker lo ha reclamado: su resultado es el que vale
+                    db.session.rollback()
+                    if stored:
+                        self._drop_capture(run_id, captured, attempts)
+                    elif captured:
+                        blobstore.release([captured], retention.new_stats())
+                        db.session.commit()
+                    log.warning("Run %s: lease perdido, se descarta este resultado", run_id)
+                    return
+                run.finished_at = datetime.utcnow()
+                run.duration_ms = int((time.time() - t0) * 1000)
+                run.lease_token = None
+                run.lease_expires_at = None
+                phases["total"] = run.duration_ms
+                run.phases_json = json.dumps(phases)
+                db.session.commit()
+
+                for name, ms in phases.items():
+                    metrics.observe("webshot_phase_seconds", ms / 1000.0, phase=name)
+                metrics.inc("webshot_runs_total", status=run.status, trigger=run.trigger)
+
+            if run.digest_batch_id:
+                try:
+                    self.finish_digest(run.digest_batch_id)
+                except Exception:
+                    db.session.rollback()
+                    log.exception("Fallo al cerrar el lote de resumen %s", run.digest_batch_id)
+
+
+def serve_metrics(worker: Worker, port: int):
+    """/metrics del worker dedicado (la web no ve sus contadores)."""
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = worker.metrics.render(worker.metric_gauges()).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("0.0.0.0", port), _Handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, name="worker-metrics", daemon=True).start()
+    return httpd
+
+
+def main():
+    from app import create_app
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    app = create_app({"APP_ROLE": "worker"})
+    worker = Worker(app).start()
+    if app.config["WORKER_METRICS_PORT"]:
+        serve_metrics(worker, app.config["WORKER_METRICS_PORT"])
+    log.info("Worker %s arrancado", worker.holder)
+    # SIGTERM (docker stop) sale por sys.exit para que atexit suelte el lease
+    def _terminate(*_):
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, _terminate)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()